@@ -56,6 +56,38 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL_NAME: str = "BAAI/bge-small-zh-v1.5"
     ES_URL: str = "http://127.0.0.1:9200"
 
+    # === 混合检索 (每一路召回的超时时间, 单位: 秒) ===
+    SEARCH_ES_TIMEOUT: float = 0.5
+    SEARCH_VECTOR_TIMEOUT: float = 1.0
+
+    # === pgvector ANN 索引 ===
+    # 索引类型: hnsw (默认，召回/延迟更好) 或 ivfflat (构建更快、占用更小)
+    VECTOR_INDEX_METHOD: str = "hnsw"
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_HNSW_EF_SEARCH: int = 64
+    VECTOR_IVFFLAT_LISTS: int = 100
+    VECTOR_IVFFLAT_PROBES: int = 10
+    # 带筛选条件的向量检索: 索引扫描结果被过滤后不足 LIMIT 时继续扫描
+    # pgvector 0.8+ 可设为 relaxed_order / strict_order；留空表示不设置 (老版本没有这个参数)
+    VECTOR_ITERATIVE_SCAN: str = ""
+
+    # === ES 原生混合检索 (可选) ===
+    # 开启后 ES 索引里额外存课程向量，关键词搜索一次 ES 请求完成 BM25 + kNN 融合，不再查 pgvector
+    ES_HYBRID_SEARCH: bool = False
+    # rrf: ES 端 RRF 融合 (需要 ES 8.14+)；linear: 按权重线性相加
+    ES_HYBRID_MODE: str = "rrf"
+    ES_HYBRID_RRF_K: int = 60
+    ES_HYBRID_KEYWORD_BOOST: float = 1.0
+    ES_HYBRID_VECTOR_BOOST: float = 1.0
+    # 关键词搜索结果的课程卡片直接用 ES _source 渲染 (一次 mget)，不再回表查 Postgres
+    # 开启前先跑一次 scripts/init_es_data.py，让老文档带上卡片字段 (缺字段的文档仍会回表)
+    COURSE_LIST_FROM_ES: bool = False
+
+    # === ES / 向量增量对账 ===
+    # 后台每隔 N 秒按 updated_at 水位线补同步一次 (0 表示不在应用内运行，可用 scripts/reconcile_es.py 定时跑)
+    ES_RECONCILE_INTERVAL: int = 0
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
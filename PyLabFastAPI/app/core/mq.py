@@ -1,6 +1,8 @@
 # PyLabFastAPI/app/core/mq.py
+import asyncio
 import json
 import logging
+from typing import List, Optional, Set, Tuple
 import aio_pika
 from aio_pika import connect_robust, Message, DeliveryMode, ExchangeType
 from app.config import settings
@@ -15,6 +17,8 @@ class RabbitMQClient:
     connection: aio_pika.Connection = None
     channel: aio_pika.Channel = None
     EXCHANGE_NAME = "pylab.direct"  # 交换机名称
+    # 批量消费者的定时 flush 任务 (保留引用防止被 GC 回收，关闭时取消)
+    _flush_tasks: Set[asyncio.Task] = set()
 
     @classmethod
     async def connect(cls):
@@ -43,6 +47,9 @@ class RabbitMQClient:
     @classmethod
     async def close(cls):
         """关闭连接"""
+        for task in list(cls._flush_tasks):
+            task.cancel()
+        cls._flush_tasks.clear()
         if cls.connection:
             await cls.connection.close()
             logger.info("🛑 [RabbitMQ] 连接已关闭")
@@ -63,6 +70,32 @@ class RabbitMQClient:
             routing_key=routing_key
         )
 
+    @classmethod
+    async def publish_batch(cls, messages: List[Tuple[str, dict]]):
+        """
+        批量发送消息: 并发发布，等待全部 publisher confirm 后返回
+        (aio-pika 的 channel 默认开启 publisher_confirms，publish 会等到 broker 确认)
+        任意一条被拒绝/失败都会抛出异常，由调用方整批重试
+        :param messages: [(routing_key, message), ...]
+        """
+        if not messages:
+            return
+        if not cls.channel or cls.channel.is_closed:
+            await cls.connect()
+
+        exchange = await cls.channel.get_exchange(cls.EXCHANGE_NAME)
+
+        await asyncio.gather(*(
+            exchange.publish(
+                Message(
+                    body=json.dumps(message).encode(),
+                    delivery_mode=DeliveryMode.PERSISTENT
+                ),
+                routing_key=routing_key
+            )
+            for routing_key, message in messages
+        ))
+
     # === [新增] 消费者监听方法 ===
     @classmethod
     async def consume(cls, queue_name: str, routing_key: str, callback_func):
@@ -98,6 +131,101 @@ class RabbitMQClient:
         await queue.consume(message_wrapper)
         logger.info(f"👂 [RabbitMQ] 正在监听队列: {queue_name} (Key: {routing_key})")
 
+    @classmethod
+    async def consume_batch(
+            cls,
+            queue_name: str,
+            routing_key: str,
+            callback_func,
+            max_batch: int = 200,
+            window: float = 0.5,
+            retry_base: float = 1.0,
+            retry_max: float = 60.0
+    ):
+        """
+        批量消费者: 攒够 max_batch 条或等满 window 秒后，整批交给 callback_func 处理，处理完再整批 ack
+        :param callback_func: 异步函数，接收 (data_list: List[dict])，按到达顺序排列
+        处理失败时等待一段时间 (从 retry_base 秒开始指数退避，最长 retry_max 秒) 后整批 nack 重新入队，
+        下游 (ES 等) 恢复前一直重试，不丢消息；无法解析的消息转存到死信队列 {queue_name}.dead，不再重试
+        """
+        # 独立 channel，prefetch 至少一个批次，否则永远攒不满
+        channel = await cls.get_new_channel()
+        await channel.set_qos(prefetch_count=max_batch * 2)
+
+        queue = await channel.declare_queue(queue_name, durable=True)
+        await queue.bind(cls.EXCHANGE_NAME, routing_key=routing_key)
+        dead_queue_name = f"{queue_name}.dead"
+        await channel.declare_queue(dead_queue_name, durable=True)
+
+        loop = asyncio.get_running_loop()
+        buffer: List[aio_pika.IncomingMessage] = []
+        # 同一时间只处理一个批次，保证 ack(multiple=True) 不会确认到下一批的消息
+        lock = asyncio.Lock()
+        timer: Optional[asyncio.TimerHandle] = None
+        # 连续失败的批次数 (决定退避时长)
+        failures = 0
+
+        async def flush():
+            nonlocal buffer, timer, failures
+            if timer:
+                timer.cancel()
+                timer = None
+            if not buffer:
+                return
+            batch, buffer = buffer, []
+
+            async with lock:
+                data_list = []
+                valid = []
+                for message in batch:
+                    try:
+                        data_list.append(json.loads(message.body.decode()))
+                        valid.append(message)
+                    except Exception as e:
+                        # 重试也不会成功: 原样转存到死信队列 (默认交换机按队列名路由) 后立即 ack，
+                        # 不留在本批里 (否则本批处理失败重新入队时会被重复转存)
+                        logger.error(f"❌ [MQ Consume Error] 消息解析失败，已转存到 {dead_queue_name}: {e}")
+                        await channel.default_exchange.publish(
+                            Message(body=message.body, delivery_mode=DeliveryMode.PERSISTENT),
+                            routing_key=dead_queue_name
+                        )
+                        await message.ack()
+                batch = valid
+                if not batch:
+                    return
+
+                try:
+                    await callback_func(data_list)
+                    # 整批确认: 一次 ack 确认该 channel 上到这条为止的所有消息
+                    await batch[-1].ack(multiple=True)
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    delay = min(retry_base * 2 ** (failures - 1), retry_max)
+                    logger.error(
+                        f"❌ [MQ Consume Error] 批量处理失败 ({len(batch)} 条)，{delay:.0f}s 后重新入队重试: {e}"
+                    )
+                    # 持有锁等待: 退避期间不处理新批次 (下游多半还没恢复)
+                    await asyncio.sleep(delay)
+                    for message in batch:
+                        await message.nack(requeue=True)
+
+        def schedule_flush():
+            task = asyncio.ensure_future(flush())
+            cls._flush_tasks.add(task)
+            task.add_done_callback(cls._flush_tasks.discard)
+
+        async def on_message(message: aio_pika.IncomingMessage):
+            nonlocal timer
+            buffer.append(message)
+            if len(buffer) >= max_batch:
+                await flush()
+            elif timer is None:
+                timer = loop.call_later(window, schedule_flush)
+
+        await queue.consume(on_message)
+        logger.info(f"👂 [RabbitMQ] 正在批量监听队列: {queue_name} (Key: {routing_key}, 批次 {max_batch} 条 / {window}s)")
+
     @classmethod
     async def get_new_channel(cls) -> aio_pika.Channel:
         if not cls.connection or cls.connection.is_closed:
@@ -0,0 +1,34 @@
+# app/core/redis_client.py
+import redis.asyncio as redis
+from app.config import settings
+
+
+class RedisClient:
+    """
+    Redis 全局客户端 (单例模式 - 类方法实现)
+    - get(): 字符串客户端 (decode_responses=True)，存 JSON / 计数器
+    - get_raw(): 二进制客户端，存向量等紧凑的 bytes 数据
+    """
+    _client: redis.Redis = None
+    _raw_client: redis.Redis = None
+
+    @classmethod
+    def get(cls) -> redis.Redis:
+        if cls._client is None:
+            cls._client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return cls._client
+
+    @classmethod
+    def get_raw(cls) -> redis.Redis:
+        if cls._raw_client is None:
+            cls._raw_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        return cls._raw_client
+
+    @classmethod
+    async def close(cls):
+        """关闭连接"""
+        for client in (cls._client, cls._raw_client):
+            if client is not None:
+                await client.aclose()
+        cls._client = None
+        cls._raw_client = None
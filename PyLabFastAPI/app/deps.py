@@ -1,4 +1,5 @@
 # app/deps.py
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.utils.jwt import MyJWT
@@ -6,6 +7,8 @@ from app.models.user import User
 
 # 定义 Token 获取路径，FastAPI 文档的 "Authorize" 按钮会用到
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+# 可选登录: 没带 Token 时不报 401，交给依赖函数返回 None
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
@@ -37,4 +40,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     if not user.is_active:
         raise HTTPException(status_code=400, detail="用户已被禁用")
 
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_optional_user_id(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[int]:
+    """
+    可选登录的依赖注入函数 (公开接口用来识别当前用户，比如判断是否已选课)
+    只验证 Token + 黑名单，不查用户表；Token 缺失/过期/被拉黑都视为未登录，返回 None
+    """
+    if not token:
+        return None
+    try:
+        # MyJWT.decode_token 失败会抛出 HTTPException
+        payload = MyJWT.decode_token(token)
+        if payload.get("type") != "access":
+            return None
+
+        sub = payload.get("sub")
+        if not sub or await MyJWT.is_token_revoked(payload.get("jti")):
+            return None
+        return int(sub)
+    except Exception:
+        # 无论是 Token 过期、格式错误还是 Redis 连接失败，都视为未登录，不报错
+        return None
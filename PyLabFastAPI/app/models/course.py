@@ -1,6 +1,7 @@
 # app/models/course.py
 from tortoise import fields, models
 from enum import Enum
+from typing import Set
 
 
 class Course(models.Model):
@@ -20,6 +21,68 @@ class Course(models.Model):
 
     class Meta:
         table = "courses"
+        # 课程列表按 最新/最热 浏览 (游标分页) 用到的排序索引在启动时创建 (见 CourseStatsService.init)：
+        # generate_schemas 不会给已存在的表补索引
+
+    # === 变更检测 (signals.py 据此判断下游 ES / 向量是否需要同步) ===
+    # 从数据库加载时留一份字段快照，保存时和当前值比较
+
+    @classmethod
+    def _init_from_db(cls, **kwargs):
+        self = super()._init_from_db(**kwargs)
+        self._snapshot = self._field_values()
+        return self
+
+    def _field_values(self) -> dict:
+        # .only() 查出来的部分字段实例里没有的字段不记录
+        return {
+            name: getattr(self, name)
+            for name in self._meta.fields_db_projection
+            if hasattr(self, name)
+        }
+
+    def changed_fields(self) -> Set[str]:
+        """相对上次加载/保存时发生变化的字段；新建的实例 (没有快照) 视为全部字段都变了"""
+        snapshot = getattr(self, "_snapshot", None)
+        current = self._field_values()
+        if snapshot is None:
+            return set(current)
+        return {name for name, value in current.items() if name in snapshot and snapshot[name] != value}
+
+    async def save(self, *args, **kwargs):
+        # post_save 信号在 super().save() 内部触发，那时快照还是旧的，可以正常比较
+        await super().save(*args, **kwargs)
+        self._snapshot = self._field_values()
+
+
+class CourseNeighbor(models.Model):
+    """
+    [推荐] 相似课程预计算表
+    每门课程存 Top-K 个最相似的已发布课程，课程向量或发布状态变化时增量重算，
+    详情页直接按 (course_id, rank) 索引读取，不再每次做向量排序
+    """
+    id = fields.IntField(pk=True)
+    course = fields.ForeignKeyField('models.Course', related_name='neighbors', on_delete=fields.CASCADE)
+    neighbor = fields.ForeignKeyField('models.Course', related_name='+', on_delete=fields.CASCADE)
+    rank = fields.IntField(description="相似度排名 (0 最相似)")
+    distance = fields.FloatField(description="余弦距离")
+
+    class Meta:
+        table = "course_neighbors"
+        unique_together = (("course", "rank"),)
+
+
+class CourseViewFlush(models.Model):
+    """
+    浏览量落库记录 (ViewCounterService.flush 的幂等标记)
+    每批增量一个 token，和 UPDATE 在同一个事务里写入；进程在提交之后、清理 Redis 之前挂掉时，
+    下次 flush 发现 token 已存在就不再重复累加
+    """
+    token = fields.CharField(max_length=32, pk=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "course_view_flushes"
 
 
 class Chapter(models.Model):
@@ -0,0 +1,18 @@
+# PyLabFastAPI/app/models/outbox.py
+from tortoise import fields, models
+
+
+class OutboxEvent(models.Model):
+    """
+    事务性发件箱 (Transactional Outbox)
+    业务写入和事件写入在同一个数据库事务里提交，由 OutboxRelay 后台批量投递到 RabbitMQ
+    """
+    id = fields.BigIntField(pk=True)
+    routing_key = fields.CharField(max_length=100, description="RabbitMQ 路由键")
+    payload = fields.JSONField(description="消息体")
+    attempts = fields.IntField(default=0, description="投递失败次数")
+    created_at = fields.DatetimeField(auto_now_add=True)
+    sent_at = fields.DatetimeField(null=True, description="投递成功时间 (为空表示待投递)")
+
+    class Meta:
+        table = "outbox_events"
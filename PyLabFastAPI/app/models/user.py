@@ -34,6 +34,30 @@ class User(models.Model):
     class Meta:
         table = "users"
 
+    # === 变更检测: 讲师显示名变了要同步到 ES 课程文档 (signals.py) ===
+
+    @property
+    def display_name(self):
+        """对外显示的名字: 昵称，没有昵称用用户名"""
+        return getattr(self, "nickname", None) or getattr(self, "username", None)
+
+    @classmethod
+    def _init_from_db(cls, **kwargs):
+        self = super()._init_from_db(**kwargs)
+        self._display_name_snapshot = self.display_name
+        return self
+
+    def display_name_changed(self) -> bool:
+        """相对上次加载/保存时显示名是否变了 (新建的实例视为变了)"""
+        if not hasattr(self, "_display_name_snapshot"):
+            return True
+        return self._display_name_snapshot != self.display_name
+
+    async def save(self, *args, **kwargs):
+        # post_save 信号在 super().save() 内部触发，那时快照还是旧的，可以正常比较
+        await super().save(*args, **kwargs)
+        self._display_name_snapshot = self.display_name
+
 
 class TeacherProfile(models.Model):
     """[扩展] 教师档案表 - 存储敏感/审核信息"""
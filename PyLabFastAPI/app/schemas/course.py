@@ -1,6 +1,6 @@
 # PyLabFastAPI/app/schemas/course.py
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, model_validator
+from typing import ClassVar, Optional, List
 from datetime import datetime
 
 
@@ -30,6 +30,48 @@ class CourseOut(CourseBase):
         from_attributes = True
 
 
+class CourseCardOut(CourseOut):
+    """
+    课程列表卡片 (公开列表 / 搜索结果)
+    可以直接接收 .values(*CARD_FIELDS) 查出来的字典 (讲师昵称通过 teacher__ 关联列取出)
+    """
+    teacher_name: Optional[str] = None
+
+    # 列表查询只取这些列，不加载整行 User / Course
+    CARD_FIELDS: ClassVar[tuple] = (
+        "id", "title", "desc", "cover", "price", "teacher_id", "is_published", "created_at", "view_count",
+        "teacher__nickname", "teacher__username",
+    )
+
+    @model_validator(mode="before")
+    @classmethod
+    def _teacher_name_from_row(cls, data):
+        if isinstance(data, dict) and "teacher_name" not in data and "teacher__username" in data:
+            data = {**data, "teacher_name": data.get("teacher__nickname") or data["teacher__username"]}
+        return data
+
+
+class CourseSearchFilter(BaseModel):
+    """
+    课程列表 / 搜索的筛选条件 (query 参数)
+    混合检索时下推到 ES bool.filter 和 pgvector 的 WHERE 里，而不是融合后再过滤
+    """
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    # True=只看免费, False=只看付费, None=不限
+    is_free: Optional[bool] = None
+    teacher_id: Optional[int] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    def is_empty(self) -> bool:
+        return not self.model_dump(exclude_none=True)
+
+    def cache_key(self) -> str:
+        """稳定的字符串表示 (用于排序缓存 / ETag 的 key)"""
+        return self.model_dump_json(exclude_none=True)
+
+
 # === 章节相关 ===
 class ChapterCreateReq(BaseModel):
     title: str
@@ -0,0 +1,80 @@
+# app/services/cache_version.py
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Set
+
+from app.core.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# deferred() 里收集到的待 bump 版本名 (None 表示不在 deferred() 里，立即 bump)
+_pending: ContextVar[Optional[Set[str]]] = ContextVar("cache_version_pending", default=None)
+
+
+class CacheVersion:
+    """
+    缓存版本号 (Redis)
+    缓存 Key 里带上版本号，数据变更时 bump 一下，旧 Key 自然失效 (等 TTL 过期)，不用逐个删除
+    版本号用纳秒时间戳而不是自增数字: Redis 数据丢失后重新生成的版本也不会和旧版本撞车
+    """
+    KEY_PREFIX = "ver"
+
+    @classmethod
+    def _key(cls, name: str) -> str:
+        return f"{cls.KEY_PREFIX}:{name}"
+
+    @classmethod
+    async def get(cls, *names: str) -> List[str]:
+        """批量获取版本号 (不存在则初始化)"""
+        client = RedisClient.get()
+        keys = [cls._key(n) for n in names]
+        versions = await client.mget(keys)
+
+        missing = [k for k, v in zip(keys, versions) if v is None]
+        if missing:
+            # NX: 并发初始化时以先写入的为准
+            async with client.pipeline(transaction=False) as pipe:
+                for k in missing:
+                    pipe.set(k, str(time.time_ns()), nx=True)
+                await pipe.execute()
+            versions = await client.mget(keys)
+
+        return versions
+
+    @classmethod
+    async def bump(cls, *names: str):
+        """数据变更: 生成新版本号 (在 deferred() 里调用时推迟到块结束后)"""
+        pending = _pending.get()
+        if pending is not None:
+            pending.update(names)
+            return
+        await cls._bump_now(*names)
+
+    @classmethod
+    @asynccontextmanager
+    async def deferred(cls):
+        """
+        推迟块内的 bump，正常退出后统一执行；块内抛异常则丢弃
+        包在 in_transaction() 外层使用 (async with CacheVersion.deferred(), in_transaction() as conn)，
+        保证版本号在事务提交之后才变: 否则并发请求可能读到新版本号 + 提交前的旧数据，把旧内容缓存在新 ETag 下
+        """
+        pending: Set[str] = set()
+        token = _pending.set(pending)
+        try:
+            yield
+        finally:
+            _pending.reset(token)
+        if pending:
+            try:
+                await cls._bump_now(*pending)
+            except Exception as e:
+                logger.warning(f"⚠️ [CacheVersion] 提交后更新版本号失败: {e}")
+
+    @classmethod
+    async def _bump_now(cls, *names: str):
+        async with RedisClient.get().pipeline(transaction=False) as pipe:
+            for n in names:
+                pipe.set(cls._key(n), str(time.time_ns()))
+            await pipe.execute()
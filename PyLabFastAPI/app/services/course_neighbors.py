@@ -0,0 +1,146 @@
+# app/services/course_neighbors.py
+import logging
+from typing import List, Set
+
+from tortoise.transactions import in_transaction
+
+from app.core.redis_client import RedisClient
+from app.models.course import Course, CourseNeighbor
+from app.services.cache_version import CacheVersion
+from app.services.vector_db import VectorDBService
+
+logger = logging.getLogger(__name__)
+
+
+class CourseNeighborService:
+    """
+    相似课程 (course_neighbors 表) 的维护与读取
+    """
+    TOP_K = 8
+    # 算过相似推荐的课程 (Redis SET，结果为空也记录)，详情页据此判断是否需要补算
+    COMPUTED_KEY = "course:neighbors:computed"
+
+    @staticmethod
+    def version_name(course_id: int) -> str:
+        """相似推荐的版本号 (CacheVersion)，详情页 ETag 用"""
+        return f"course_neighbors:{course_id}"
+
+    @classmethod
+    async def recompute(cls, course_id: int):
+        """重算单门课程的 Top-K 相似课程 (整组替换；查询失败时保留旧数据)"""
+        neighbors = await VectorDBService.search_similar_by_id(course_id, limit=cls.TOP_K, raise_on_error=True)
+
+        async with in_transaction():
+            await CourseNeighbor.filter(course_id=course_id).delete()
+            if neighbors:
+                await CourseNeighbor.bulk_create([
+                    CourseNeighbor(
+                        course_id=course_id,
+                        neighbor_id=item["id"],
+                        rank=rank,
+                        distance=float(item["distance"])
+                    )
+                    for rank, item in enumerate(neighbors)
+                ])
+
+        await CacheVersion.bump(cls.version_name(course_id))
+        await RedisClient.get().sadd(cls.COMPUTED_KEY, str(course_id))
+
+    @classmethod
+    async def claim_initial_compute(cls, course_id: int) -> bool:
+        """
+        详情页发现课程没有相似推荐时调用: 只有从没算过 (且没有其他请求抢先) 的课程返回 True
+        算出来为空的课程 (没有向量 / 没有足够相似的课程) 不会每次浏览都重算
+        """
+        return bool(await RedisClient.get().sadd(cls.COMPUTED_KEY, str(course_id)))
+
+    @classmethod
+    async def initial_compute(cls, course_id: int):
+        """[后台任务] 首次补算；失败时撤销标记，下次浏览再试"""
+        try:
+            await cls.recompute(course_id)
+        except Exception as e:
+            logger.error(f"❌ [Neighbors] 补算课程 {course_id} 相似推荐失败: {e}")
+            await RedisClient.get().srem(cls.COMPUTED_KEY, str(course_id))
+
+    @classmethod
+    async def refresh_affected(cls, course_id: int):
+        """
+        某门课程的向量或发布状态变了，增量重算受影响的课程:
+        1. 它自己
+        2. 之前把它列为相似课程的课程 (它可能变远了 / 下架了)
+        3. 它现在的相似课程 (相似关系近似对称，它可能要进入对方的 Top-K)
+        """
+        try:
+            affected: Set[int] = {course_id}
+            affected.update(await CourseNeighbor.filter(neighbor_id=course_id).values_list("course_id", flat=True))
+
+            await cls.recompute(course_id)
+            affected.update(await CourseNeighbor.filter(course_id=course_id).values_list("neighbor_id", flat=True))
+            affected.discard(course_id)
+
+            for cid in affected:
+                await cls.recompute(cid)
+            logger.info(f"🧭 [Neighbors] 课程 {course_id} 相似推荐已更新 (影响 {len(affected) + 1} 门)")
+        except Exception as e:
+            logger.error(f"❌ [Neighbors] 更新课程 {course_id} 相似推荐失败: {e}")
+
+    @classmethod
+    async def refresh_affected_many(cls, course_ids: List[int]):
+        """
+        [批量] 一批课程的向量变了: 受影响的课程合并去重后每门只重算一次
+        (逐门调用 refresh_affected 时，相互邻近的课程会被重复重算)
+        """
+        if not course_ids:
+            return
+        try:
+            changed: Set[int] = set(course_ids)
+            affected: Set[int] = set(
+                await CourseNeighbor.filter(neighbor_id__in=list(changed)).values_list("course_id", flat=True)
+            )
+
+            await cls.recompute_many(list(changed))
+            affected.update(
+                await CourseNeighbor.filter(course_id__in=list(changed)).values_list("neighbor_id", flat=True)
+            )
+            affected -= changed
+
+            await cls.recompute_many(list(affected))
+            logger.info(f"🧭 [Neighbors] {len(changed)} 门课程相似推荐已更新 (影响 {len(changed) + len(affected)} 门)")
+        except Exception as e:
+            logger.error(f"❌ [Neighbors] 批量更新相似推荐失败: {e}")
+
+    @classmethod
+    async def referrers(cls, course_id: int) -> List[int]:
+        """把该课程列为相似课程的课程ID (删除课程前先记下来，删除后重算它们)"""
+        return await CourseNeighbor.filter(neighbor_id=course_id).values_list("course_id", flat=True)
+
+    @classmethod
+    async def recompute_many(cls, course_ids: List[int]):
+        for cid in course_ids:
+            try:
+                await cls.recompute(cid)
+            except Exception as e:
+                logger.error(f"❌ [Neighbors] 重算课程 {cid} 相似推荐失败: {e}")
+
+    @classmethod
+    async def rebuild_all(cls):
+        """[运维] 全量重建 (批量刷新向量之后调用)"""
+        course_ids = await Course.all().order_by("id").values_list("id", flat=True)
+        await cls.recompute_many(course_ids)
+
+    @classmethod
+    async def get_related(cls, course_id: int, limit: int = 4) -> List[dict]:
+        """详情页读取相似课程: 一次 (course_id, rank) 索引查询 + 连表取展示字段"""
+        return await CourseNeighbor.filter(course_id=course_id, neighbor__is_published=True) \
+            .order_by("rank") \
+            .limit(limit) \
+            .values(
+                "distance",
+                id="neighbor__id",
+                title="neighbor__title",
+                desc="neighbor__desc",
+                cover="neighbor__cover",
+                price="neighbor__price",
+                view_count="neighbor__view_count",
+            )
@@ -0,0 +1,211 @@
+# app/services/course_reconcile.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from elasticsearch.helpers import async_scan
+from tortoise import timezone
+from tortoise.expressions import Q
+
+from app.config import settings
+from app.core.es import ESClient
+from app.core.redis_client import RedisClient
+from app.models.course import Course
+from app.services.es_sync import CourseESService
+from app.services.vector_db import VectorDBService
+
+logger = logging.getLogger(__name__)
+
+
+class CourseReconcileService:
+    """
+    ES / 课程向量增量对账 (兜底消息丢失、消费失败等导致的不一致)
+    1. 水位线: 按 (updated_at, id) 游标分批扫描上次对账之后改过的课程，每批一次 _bulk 整篇重写 ES；
+       向量缺失、或 ES 里的标题/简介和数据库对不上 (说明那次同步没生效，向量也没跟着更新) 的课程批量重新生成向量
+    2. 孤儿清理: 对比 ES 和数据库的课程 ID 集合，删掉 ES 里多出来的文档，补上 ES 里缺的文档
+    水位线存在 Redis，每批处理完就推进，中途失败下次从断点继续
+    """
+    WATERMARK_KEY = "course:reconcile:watermark"
+    # 多进程部署时保证同一时刻只有一个进程在对账
+    LOCK_KEY = "course:reconcile:lock"
+    LOCK_TTL = 600
+    BATCH_SIZE = 500
+    # 只处理 SAFETY_LAG 秒之前改过的课程: updated_at 在提交前就生成了，
+    # 慢事务晚提交的行 updated_at 可能小于已推进的水位线，留出这段时间等它们提交
+    SAFETY_LAG = 30
+    ES_SCAN_SIZE = 5000
+
+    @classmethod
+    async def init(cls):
+        """水位线扫描按 (updated_at, id) 排序，建个联合索引"""
+        conn = Course._meta.db
+        await conn.execute_query(
+            "CREATE INDEX IF NOT EXISTS idx_courses_updated_at_id ON courses (updated_at, id);"
+        )
+
+    # === 水位线 ===
+
+    @classmethod
+    async def get_watermark(cls) -> Optional[Tuple[datetime, int]]:
+        raw = await RedisClient.get().get(cls.WATERMARK_KEY)
+        if not raw:
+            return None
+        ts, course_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(course_id)
+
+    @classmethod
+    async def set_watermark(cls, updated_at: datetime, course_id: int):
+        await RedisClient.get().set(cls.WATERMARK_KEY, f"{updated_at.isoformat()}|{course_id}")
+
+    @classmethod
+    async def reset_watermark(cls):
+        """清空水位线 (下次对账从头扫描全部课程)"""
+        await RedisClient.get().delete(cls.WATERMARK_KEY)
+
+    # === 增量同步 ===
+
+    @classmethod
+    async def _es_texts(cls, course_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        """一次 mget 取出这批课程在 ES 里的标题/简介 (ES 里没有的课程不在结果里)"""
+        resp = await ESClient.get().mget(
+            index=CourseESService.INDEX_NAME,
+            ids=[str(cid) for cid in course_ids],
+            source_includes=["title", "desc"]
+        )
+        return {
+            int(doc["_id"]): (doc["_source"].get("title"), doc["_source"].get("desc") or "")
+            for doc in resp["docs"] if doc.get("found")
+        }
+
+    @classmethod
+    async def _sync_batch(cls, courses: List[Course]) -> Tuple[int, int, int]:
+        """
+        同步一批课程到 ES 和向量列
+        :return: (ES 成功数, ES 失败数, 重新生成向量数)
+        """
+        ids = [c.id for c in courses]
+        # 只有混合检索模式下 ES 文档才带向量，需要把已有向量读出来；否则只查哪些课程还没有向量
+        embeddings = {}
+        if settings.ES_HYBRID_SEARCH:
+            embeddings = await VectorDBService.get_course_embeddings(ids)
+            missing = set(ids) - set(embeddings)
+        else:
+            missing = await VectorDBService.ids_without_embedding(ids)
+        es_texts = await cls._es_texts(ids)
+
+        stale = [
+            c for c in courses
+            if c.id in missing or es_texts.get(c.id) != (c.title, c.desc or "")
+        ]
+        fresh = await VectorDBService.update_course_embeddings(stale)
+        embeddings.update(fresh)
+
+        success, failed = await CourseESService.bulk_sync(
+            courses, embeddings=embeddings if settings.ES_HYBRID_SEARCH else None
+        )
+        return success, failed, len(fresh)
+
+    @classmethod
+    async def sync_changed(cls) -> Dict[str, int]:
+        """按水位线同步上次对账之后改过的课程"""
+        stats = {"scanned": 0, "indexed": 0, "failed": 0, "embedded": 0}
+        cutoff = timezone.now() - timedelta(seconds=cls.SAFETY_LAG)
+        watermark = await cls.get_watermark()
+
+        while True:
+            query = Course.filter(updated_at__lt=cutoff)
+            if watermark:
+                ts, last_id = watermark
+                query = query.filter(Q(updated_at__gt=ts) | Q(updated_at=ts, id__gt=last_id))
+            courses = await query.order_by("updated_at", "id").limit(cls.BATCH_SIZE)
+            if not courses:
+                break
+
+            success, failed, embedded = await cls._sync_batch(courses)
+            stats["scanned"] += len(courses)
+            stats["indexed"] += success
+            stats["failed"] += failed
+            stats["embedded"] += embedded
+            if failed:
+                # 水位线停在这批之前，下次对账重试
+                logger.warning(f"⚠️ [Reconcile] {failed} 条写入 ES 失败，水位线暂不推进")
+                break
+
+            watermark = (courses[-1].updated_at, courses[-1].id)
+            await cls.set_watermark(*watermark)
+
+        return stats
+
+    # === 孤儿清理 ===
+
+    @classmethod
+    async def _es_ids(cls) -> Set[int]:
+        """滚动扫描 ES 里所有文档的 ID (不取 _source)"""
+        ids = set()
+        async for hit in async_scan(
+            ESClient.get(),
+            index=CourseESService.INDEX_NAME,
+            query={"query": {"match_all": {}}, "_source": False},
+            size=cls.ES_SCAN_SIZE
+        ):
+            ids.add(int(hit["_id"]))
+        return ids
+
+    @classmethod
+    async def sync_orphans(cls) -> Dict[str, int]:
+        """
+        对比 ES 和数据库的课程 ID 集合
+        先取 ES 再取数据库: 两次读取之间新建的课程只会出现在数据库集合里，不会被误删
+        """
+        es_ids = await cls._es_ids()
+        db_ids = set(await Course.all().values_list("id", flat=True))
+
+        orphan_ids = es_ids - db_ids
+        missing_ids = sorted(db_ids - es_ids)
+
+        stats = {"deleted": 0, "restored": 0, "failed": 0}
+        if orphan_ids:
+            success, failed = await CourseESService.bulk_sync([], delete_ids=orphan_ids)
+            stats["deleted"] += success
+            stats["failed"] += failed
+
+        for i in range(0, len(missing_ids), cls.BATCH_SIZE):
+            courses = await Course.filter(id__in=missing_ids[i:i + cls.BATCH_SIZE])
+            success, failed, _ = await cls._sync_batch(courses)
+            stats["restored"] += success
+            stats["failed"] += failed
+        return stats
+
+    # === 入口 ===
+
+    @classmethod
+    async def reconcile(cls, orphans: bool = True) -> Optional[Dict[str, int]]:
+        """
+        执行一次对账
+        :param orphans: 是否做 ID 集合比对
+        :return: 统计信息；其他进程正在对账时返回 None
+        """
+        client = RedisClient.get()
+        if not await client.set(cls.LOCK_KEY, "1", nx=True, ex=cls.LOCK_TTL):
+            return None
+
+        try:
+            stats = await cls.sync_changed()
+            if orphans:
+                stats.update(await cls.sync_orphans())
+            return stats
+        finally:
+            await client.delete(cls.LOCK_KEY)
+
+    @classmethod
+    async def run(cls, interval: int):
+        """后台循环 (在 lifespan 里启动)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                stats = await cls.reconcile()
+                if stats and any(v for k, v in stats.items() if k != "scanned"):
+                    logger.info(f"🔁 [Reconcile] 对账完成: {stats}")
+            except Exception as e:
+                logger.error(f"❌ [Reconcile] 对账失败: {e}")
@@ -0,0 +1,190 @@
+# app/services/course_search.py
+import asyncio
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from typing import List, Optional
+
+from app.config import settings
+from app.core.redis_client import RedisClient
+from app.schemas.course import CourseSearchFilter
+from app.services.cache_version import CacheVersion
+from app.services.embedding_cache import EmbeddingCache
+from app.services.es_sync import CourseESService
+from app.services.vector_db import VectorDBService
+
+logger = logging.getLogger(__name__)
+
+
+class HybridSearchService:
+    """
+    课程混合检索: ES (关键词) + pgvector (语义) 双路并发召回，RRF 融合排序
+    """
+    # RRF 平滑常数 k (一般取 60)
+    RRF_K = 60
+    # 每一路的召回深度
+    RECALL_LIMIT = 50
+    # 向量召回的距离阈值 (scripts/bench_search.py 可以用来评估调参)
+    VECTOR_THRESHOLD = 0.34
+    # 融合排序结果缓存 (翻页时直接读缓存，不再重新召回)
+    CACHE_TTL = 60
+    # 课程发布/下架时 bump 这个版本号，旧的排序缓存全部失效
+    CACHE_VERSION = "course_search"
+
+    @classmethod
+    async def _recall(cls, name: str, coro, timeout: float) -> Optional[list]:
+        """
+        带超时的单路召回
+        超时 / 异常时返回 None (表示该路降级)，不影响另一路的结果
+        """
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ [Search] {name} 召回超时 (>{timeout}s)，已降级")
+        except Exception as e:
+            logger.warning(f"⚠️ [Search] {name} 召回失败，已降级: {e}")
+        return None
+
+    @classmethod
+    def rrf_fuse(cls, *rankings: List[dict]) -> List[tuple]:
+        """
+        RRF 融合: Score = Σ 1 / (k + rank)
+        :return: [(course_id, score), ...] 按分数倒序
+        """
+        fused_scores = defaultdict(float)
+        for hits in rankings:
+            # rank 从 0 开始，所以 +1
+            for rank, item in enumerate(hits):
+                fused_scores[item['id']] += 1 / (cls.RRF_K + rank + 1)
+
+        return sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
+
+    @classmethod
+    async def search(cls, keyword: str, filters: Optional[CourseSearchFilter] = None) -> dict:
+        """
+        带缓存的混合检索
+        完整的融合排序 (有序 ID 列表) 按 归一化关键词 + 筛选条件 缓存，第 2..N 页只需读一次缓存
+        :param filters: 筛选条件，下推到两路召回内部 (ES bool.filter / pgvector WHERE)
+        :return: {"ids": [按 RRF 排好序的课程ID], "degraded": [降级的召回路名称], "facets": ES 分面计数 | None}
+        """
+        normalized = EmbeddingCache.normalize(keyword)
+        filters = filters if filters and not filters.is_empty() else None
+        cache_key = None
+
+        try:
+            version, = await CacheVersion.get(cls.CACHE_VERSION)
+            raw = normalized + "|" + (filters.cache_key() if filters else "")
+            digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+            cache_key = f"search:rrf:{version}:{digest}"
+
+            cached = await RedisClient.get().get(cache_key)
+            if cached:
+                return {**json.loads(cached), "degraded": []}
+        except Exception as e:
+            logger.warning(f"⚠️ [Search] 读取排序缓存失败: {e}")
+
+        ranking = await cls._search(normalized, filters)
+
+        # 降级结果不缓存，避免一次超时影响后续 CACHE_TTL 内的所有翻页
+        if cache_key and not ranking["degraded"]:
+            try:
+                payload = json.dumps({"ids": ranking["ids"], "facets": ranking["facets"]})
+                await RedisClient.get().set(cache_key, payload, ex=cls.CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"⚠️ [Search] 写入排序缓存失败: {e}")
+
+        return ranking
+
+    @classmethod
+    async def invalidate(cls):
+        """课程发布/下架/删除后调用，使所有排序缓存失效"""
+        try:
+            await CacheVersion.bump(cls.CACHE_VERSION)
+        except Exception as e:
+            logger.warning(f"⚠️ [Search] 排序缓存失效失败: {e}")
+
+    @classmethod
+    async def _es_recall(cls, keyword: str, filters: Optional[CourseSearchFilter] = None) -> dict:
+        """ES 召回路: 只要 id + score，不计算总数；分面计数在同一次请求里返回"""
+        return await CourseESService.search(
+            keyword,
+            size=cls.RECALL_LIMIT,
+            ids_only=True,
+            track_total_hits=False,
+            filters=filters,
+            facets=True
+        )
+
+    @classmethod
+    def _vector_recall(cls, keyword: str, filters: Optional[CourseSearchFilter] = None):
+        return VectorDBService.search_similar_courses(
+            keyword, limit=cls.RECALL_LIMIT, threshold=cls.VECTOR_THRESHOLD, raise_on_error=True, filters=filters
+        )
+
+    @classmethod
+    async def _search(cls, keyword: str, filters: Optional[CourseSearchFilter] = None) -> dict:
+        """
+        并发召回 + 融合
+        """
+        if settings.ES_HYBRID_SEARCH:
+            return await cls._search_in_es(keyword, filters)
+
+        es_resp, vector_hits = await asyncio.gather(
+            cls._recall(
+                "es",
+                cls._es_recall(keyword, filters),
+                settings.SEARCH_ES_TIMEOUT
+            ),
+            cls._recall(
+                "vector",
+                cls._vector_recall(keyword, filters),
+                settings.SEARCH_VECTOR_TIMEOUT
+            ),
+        )
+
+        es_hits = es_resp["hits"] if es_resp is not None else None
+        degraded = [name for name, hits in (("es", es_hits), ("vector", vector_hits)) if hits is None]
+
+        sorted_results = cls.rrf_fuse(es_hits or [], vector_hits or [])
+
+        return {
+            "ids": [cid for cid, score in sorted_results],
+            "degraded": degraded,
+            "facets": es_resp["facets"] if es_resp is not None else None
+        }
+
+    @classmethod
+    async def _search_in_es(cls, keyword: str, filters: Optional[CourseSearchFilter] = None) -> dict:
+        """
+        [ES 原生混合检索模式] BM25 + kNN 在一次 ES 请求里完成召回和融合
+        - 查询向量生成失败: 退化为 ES 纯关键词召回
+        - ES 失败: 退化为 pgvector 向量召回
+        """
+        embedding = await cls._recall(
+            "embedding",
+            VectorDBService.get_embedding(keyword),
+            settings.SEARCH_VECTOR_TIMEOUT
+        )
+        if not embedding:
+            es_resp = await cls._recall("es", cls._es_recall(keyword, filters), settings.SEARCH_ES_TIMEOUT)
+            if es_resp is None:
+                return {"ids": [], "degraded": ["es", "vector"], "facets": None}
+            return {"ids": [h["id"] for h in es_resp["hits"]], "degraded": ["vector"], "facets": es_resp["facets"]}
+
+        resp = await cls._recall(
+            "es",
+            CourseESService.hybrid_search(keyword, embedding, size=cls.RECALL_LIMIT, filters=filters, facets=True),
+            settings.SEARCH_ES_TIMEOUT
+        )
+        if resp is not None:
+            return {"ids": [h["id"] for h in resp["hits"]], "degraded": [], "facets": resp["facets"]}
+
+        # 查询向量已经在缓存里，这里不会再请求一次 Ollama
+        vector_hits = await cls._recall(
+            "vector",
+            cls._vector_recall(keyword, filters),
+            settings.SEARCH_VECTOR_TIMEOUT
+        )
+        degraded = ["es"] if vector_hits is not None else ["es", "vector"]
+        return {"ids": [h["id"] for h in vector_hits or []], "degraded": degraded, "facets": None}
@@ -0,0 +1,44 @@
+# app/services/course_stats.py
+import logging
+
+from app.core.redis_client import RedisClient
+from app.models.course import Course
+
+logger = logging.getLogger(__name__)
+
+
+class CourseStatsService:
+    """课程统计 (近似值，Redis 缓存定期刷新)"""
+    PUBLISHED_COUNT_KEY = "course:published_count"
+    # 列表页的 total 只用于展示，允许有 1 分钟的误差
+    COUNT_TTL = 60
+
+    # 课程列表按 最新/最热 浏览 (游标分页) 用到的排序索引
+    BROWSE_INDEXES = {
+        "idx_courses_published_created": "(is_published, created_at, id)",
+        "idx_courses_published_views": "(is_published, view_count, created_at, id)",
+    }
+
+    @classmethod
+    async def init(cls):
+        """创建列表排序索引 (幂等；老库的 courses 表也能补上)"""
+        conn = Course._meta.db
+        for name, columns in cls.BROWSE_INDEXES.items():
+            await conn.execute_query(f"CREATE INDEX IF NOT EXISTS {name} ON courses {columns};")
+
+    @classmethod
+    async def published_count(cls) -> int:
+        """已发布课程总数: 缓存过期后才重新 COUNT(*) 一次"""
+        try:
+            cached = await RedisClient.get().get(cls.PUBLISHED_COUNT_KEY)
+            if cached is not None:
+                return int(cached)
+        except Exception as e:
+            logger.warning(f"⚠️ [Stats] 读取课程总数缓存失败: {e}")
+
+        count = await Course.filter(is_published=True).count()
+        try:
+            await RedisClient.get().set(cls.PUBLISHED_COUNT_KEY, count, ex=cls.COUNT_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ [Stats] 写入课程总数缓存失败: {e}")
+        return count
@@ -0,0 +1,85 @@
+# app/services/course_suggest.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+from app.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.es_sync import CourseESService
+
+logger = logging.getLogger(__name__)
+
+
+class CourseSuggestService:
+    """
+    搜索框联想 (边输入边提示)
+    - ES completion suggester: 只做标题前缀匹配，不生成向量、不走混合检索
+    - 短前缀 (输入前几个字) 请求最密集、结果也最稳定，进程内缓存直接返回
+    完整的混合检索只在用户提交搜索时才走 get_courses
+    """
+    # 只缓存长度 <= 该值的前缀 (长前缀组合太多，命中率低)
+    CACHE_PREFIX_LEN = 4
+    CACHE_MAX_SIZE = 2048
+    CACHE_TTL = 60
+    MAX_SIZE = 10
+
+    _cache: "OrderedDict[Tuple[str, int], Tuple[float, List[dict]]]" = OrderedDict()
+
+    @staticmethod
+    def normalize(prefix: str) -> str:
+        """全角转半角 + 合并空白 + 转小写 (completion 字段用 simple 分词器，本身大小写不敏感)"""
+        return EmbeddingCache.normalize(prefix).lower()
+
+    @classmethod
+    def _cache_get(cls, key: Tuple[str, int]):
+        item = cls._cache.get(key)
+        if item is None:
+            return None
+        expires_at, suggestions = item
+        if expires_at < time.monotonic():
+            cls._cache.pop(key, None)
+            return None
+        cls._cache.move_to_end(key)
+        return suggestions
+
+    @classmethod
+    def _cache_put(cls, key: Tuple[str, int], suggestions: List[dict]):
+        cls._cache[key] = (time.monotonic() + cls.CACHE_TTL, suggestions)
+        cls._cache.move_to_end(key)
+        if len(cls._cache) > cls.CACHE_MAX_SIZE:
+            cls._cache.popitem(last=False)
+
+    @classmethod
+    async def suggest(cls, prefix: str, size: int = 8) -> List[dict]:
+        """
+        :return: [{"id": 课程ID, "title": 标题}, ...]；ES 超时/失败时返回空列表 (联想失败不影响搜索)
+        """
+        prefix = cls.normalize(prefix or "")
+        size = max(1, min(size, cls.MAX_SIZE))
+        if not prefix:
+            return []
+
+        cacheable = len(prefix) <= cls.CACHE_PREFIX_LEN
+        key = (prefix, size)
+        if cacheable:
+            cached = cls._cache_get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            suggestions = await asyncio.wait_for(
+                CourseESService.suggest(prefix, size=size),
+                timeout=settings.SEARCH_ES_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ [Suggest] 联想超时 (>{settings.SEARCH_ES_TIMEOUT}s)")
+            return []
+        except Exception as e:
+            logger.warning(f"⚠️ [Suggest] 联想失败: {e}")
+            return []
+
+        if cacheable:
+            cls._cache_put(key, suggestions)
+        return suggestions
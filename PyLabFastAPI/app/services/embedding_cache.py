@@ -0,0 +1,114 @@
+# app/services/embedding_cache.py
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    查询向量二级缓存
+    - L1: 进程内 LRU (有容量上限)
+    - L2: Redis (带 TTL，多进程共享)
+    Key = 模型名 + 归一化后的文本；Value = float32 bytes (768 维约 3KB，比 JSON 列表小得多)
+    """
+    L1_MAX_SIZE = 2048
+    L2_TTL = 3600 * 24 * 7  # 7 天
+    KEY_PREFIX = "emb"
+    STATS_LOG_INTERVAL = 600  # 秒
+
+    _l1: "OrderedDict[str, bytes]" = OrderedDict()
+    _stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """归一化: 全角转半角 + 合并空白 (不转小写，向量模型对大小写敏感)"""
+        text = unicodedata.normalize("NFKC", text)
+        return " ".join(text.split())
+
+    @classmethod
+    def _key(cls, model: str, normalized_text: str) -> str:
+        digest = hashlib.sha1(normalized_text.encode("utf-8")).hexdigest()
+        return f"{cls.KEY_PREFIX}:{model}:{digest}"
+
+    @staticmethod
+    def pack(embedding: List[float]) -> bytes:
+        return array("f", embedding).tobytes()
+
+    @staticmethod
+    def unpack(data: bytes) -> List[float]:
+        vec = array("f")
+        vec.frombytes(data)
+        return vec.tolist()
+
+    @classmethod
+    def _l1_put(cls, key: str, data: bytes):
+        cls._l1[key] = data
+        cls._l1.move_to_end(key)
+        if len(cls._l1) > cls.L1_MAX_SIZE:
+            cls._l1.popitem(last=False)
+
+    @classmethod
+    async def get(cls, model: str, normalized_text: str) -> Optional[List[float]]:
+        key = cls._key(model, normalized_text)
+
+        # 1. L1 进程内
+        data = cls._l1.get(key)
+        if data is not None:
+            cls._l1.move_to_end(key)
+            cls._stats["l1_hits"] += 1
+            return cls.unpack(data)
+
+        # 2. L2 Redis (挂了就当未命中，不影响主流程)
+        try:
+            data = await RedisClient.get_raw().get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ [EmbeddingCache] Redis 读取失败: {e}")
+            data = None
+
+        if data is not None:
+            cls._stats["l2_hits"] += 1
+            cls._l1_put(key, data)
+            return cls.unpack(data)
+
+        cls._stats["misses"] += 1
+        return None
+
+    @classmethod
+    async def set(cls, model: str, normalized_text: str, embedding: List[float]):
+        key = cls._key(model, normalized_text)
+        data = cls.pack(embedding)
+        cls._l1_put(key, data)
+        try:
+            await RedisClient.get_raw().set(key, data, ex=cls.L2_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ [EmbeddingCache] Redis 写入失败: {e}")
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """命中/未命中计数"""
+        total = sum(cls._stats.values())
+        hits = cls._stats["l1_hits"] + cls._stats["l2_hits"]
+        return {
+            **cls._stats,
+            "l1_size": len(cls._l1),
+            "hit_rate": round(hits / total, 4) if total else 0.0
+        }
+
+    @classmethod
+    async def run_stats_logger(cls):
+        """后台循环 (在 lifespan 里启动): 定期打印一次命中率，期间没有查询就不打印"""
+        last_total = 0
+        while True:
+            await asyncio.sleep(cls.STATS_LOG_INTERVAL)
+            total = cls._stats["l1_hits"] + cls._stats["l2_hits"] + cls._stats["misses"]
+            if total != last_total:
+                last_total = total
+                logger.info(f"📊 [EmbeddingCache] {cls.get_stats()}")
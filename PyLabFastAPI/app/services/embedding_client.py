@@ -0,0 +1,124 @@
+# app/services/embedding_client.py
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingClient:
+    """
+    进程级 Ollama 向量客户端
+    - 复用同一个 httpx.AsyncClient (长连接池)，不再每次请求都握手
+    - 微批处理: BATCH_WINDOW 内到达的并发请求合并成一次 /api/embed 批量调用，
+      结果再按文本分发回各自的调用方
+    """
+    OLLAMA_URL = "http://localhost:11434/api/embed"
+    BATCH_WINDOW = 0.005  # 合并窗口 (秒)
+    MAX_BATCH_SIZE = 64  # 单批最多文本数，攒够立即发送
+    TIMEOUT = 30.0
+
+    _http: Optional[httpx.AsyncClient] = None
+    # {model: [(text, future), ...]}
+    _pending: Dict[str, list] = {}
+    _timers: Dict[str, asyncio.TimerHandle] = {}
+    # 持有批处理 task 的引用，防止被 GC 回收
+    _tasks: set = set()
+
+    @classmethod
+    def _get_http(cls) -> httpx.AsyncClient:
+        if cls._http is None or cls._http.is_closed:
+            cls._http = httpx.AsyncClient(
+                timeout=cls.TIMEOUT,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return cls._http
+
+    @classmethod
+    async def close(cls):
+        """关闭连接池"""
+        if cls._http is not None:
+            await cls._http.aclose()
+            cls._http = None
+
+    @classmethod
+    async def _post(cls, model: str, texts: List[str]) -> List[List[float]]:
+        """一次批量调用 Ollama"""
+        response = await cls._get_http().post(
+            cls.OLLAMA_URL,
+            json={"model": model, "input": texts}
+        )
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise RuntimeError(f"Ollama 返回的向量数量不匹配: {len(embeddings)} != {len(texts)}")
+        return embeddings
+
+    @classmethod
+    async def embed(cls, text: str, model: str) -> List[float]:
+        """
+        单条文本向量化 (会和同一时间窗口内的其他请求合并发送)
+        失败时抛出异常
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = cls._pending.setdefault(model, [])
+        batch.append((text, future))
+
+        if len(batch) >= cls.MAX_BATCH_SIZE:
+            cls._flush(model)
+        elif model not in cls._timers:
+            cls._timers[model] = loop.call_later(cls.BATCH_WINDOW, cls._flush, model)
+
+        return await future
+
+    @classmethod
+    def _flush(cls, model: str):
+        """把当前攒的批次交给后台 task 发送"""
+        timer = cls._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = cls._pending.pop(model, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(cls._send_batch(model, batch))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def _send_batch(cls, model: str, batch: list):
+        # 调用方可能已超时取消，跳过它们；同一批里重复的文本只算一次
+        waiting = [(text, fut) for text, fut in batch if not fut.done()]
+        if not waiting:
+            return
+        texts = list(dict.fromkeys(text for text, _ in waiting))
+
+        try:
+            embeddings = await cls._post(model, texts)
+        except Exception as e:
+            logger.warning(f"⚠️ [Embedding] 批量请求失败 (batch={len(texts)}): {e}")
+            for _, fut in waiting:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        result = dict(zip(texts, embeddings))
+        for text, fut in waiting:
+            if not fut.done():
+                fut.set_result(result[text])
+
+    @classmethod
+    async def embed_many(cls, texts: List[str], model: str) -> List[List[float]]:
+        """
+        [批量任务专用] 按 MAX_BATCH_SIZE 分块顺序请求，不走合并窗口
+        失败时抛出异常
+        """
+        embeddings = []
+        for i in range(0, len(texts), cls.MAX_BATCH_SIZE):
+            embeddings.extend(await cls._post(model, texts[i:i + cls.MAX_BATCH_SIZE]))
+        return embeddings
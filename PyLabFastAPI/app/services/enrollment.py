@@ -0,0 +1,94 @@
+# app/services/enrollment.py
+import logging
+from typing import Dict, Iterable, List
+
+from app.core.redis_client import RedisClient
+from app.models.course import UserCourse
+
+logger = logging.getLogger(__name__)
+
+
+class EnrollmentService:
+    """
+    用户选课关系缓存: 每个用户一个 Redis Set (user:{uid}:courses)
+    判断 is_joined 只需一次 SMISMEMBER，详情页 / 列表页都不再查 UserCourse 表
+    """
+    KEY = "user:{user_id}:courses"
+    # 哨兵成员: 存在即表示该用户的集合已从数据库完整加载 (区分 "没选课" 和 "缓存没加载")
+    SENTINEL = "0"
+    # 冷用户的集合自动过期，下次访问再从数据库加载
+    TTL = 7 * 86400
+
+    @classmethod
+    def _key(cls, user_id: int) -> str:
+        return cls.KEY.format(user_id=user_id)
+
+    @classmethod
+    async def _load(cls, user_id: int) -> List[int]:
+        """
+        从数据库加载该用户的全部选课，并入集合 (带哨兵)
+        只 SADD 不先 DELETE: 读库之后并发 add() 写进去的新选课不会被覆盖掉 (退课等删除走 invalidate)
+        """
+        course_ids = await UserCourse.filter(user_id=user_id).values_list("course_id", flat=True)
+
+        key = cls._key(user_id)
+        pipe = RedisClient.get().pipeline(transaction=True)
+        pipe.sadd(key, cls.SENTINEL, *course_ids)
+        pipe.expire(key, cls.TTL)
+        await pipe.execute()
+        return list(course_ids)
+
+    @classmethod
+    async def joined_map(cls, user_id: int, course_ids: Iterable[int]) -> Dict[int, bool]:
+        """
+        批量判断用户是否已加入这些课程
+        :return: {course_id: 是否已加入}
+        """
+        course_ids = list(course_ids)
+        if not user_id or not course_ids:
+            return {cid: False for cid in course_ids}
+
+        try:
+            # 哨兵和课程 ID 一起查，一次往返就能知道集合是否已加载
+            flags = await RedisClient.get().smismember(cls._key(user_id), [cls.SENTINEL, *course_ids])
+            if flags[0]:
+                return {cid: bool(flag) for cid, flag in zip(course_ids, flags[1:])}
+
+            joined = set(await cls._load(user_id))
+            return {cid: cid in joined for cid in course_ids}
+        except Exception as e:
+            logger.warning(f"⚠️ [Enrollment] 读取选课缓存失败，回退数据库: {e}")
+
+        joined = set(await UserCourse.filter(
+            user_id=user_id, course_id__in=course_ids
+        ).values_list("course_id", flat=True))
+        return {cid: cid in joined for cid in course_ids}
+
+    @classmethod
+    async def is_joined(cls, user_id: int, course_id: int) -> bool:
+        return (await cls.joined_map(user_id, [course_id]))[course_id]
+
+    @classmethod
+    async def add(cls, user_id: int, course_id: int):
+        """
+        加入课程后调用 (选课已提交之后)
+        集合没加载时也直接追加: 没有哨兵的集合读取时仍会从数据库加载并合并，
+        而并发加载中 (读库早于本次选课) 的请求也不会把这条选课丢掉
+        """
+        try:
+            key = cls._key(user_id)
+            pipe = RedisClient.get().pipeline(transaction=True)
+            pipe.sadd(key, course_id)
+            pipe.expire(key, cls.TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ [Enrollment] 更新选课缓存失败: {e}")
+            await cls.invalidate(user_id)
+
+    @classmethod
+    async def invalidate(cls, user_id: int):
+        """选课关系在别处被修改 (退课 / 删除课程) 时调用，下次读取重新加载"""
+        try:
+            await RedisClient.get().delete(cls._key(user_id))
+        except Exception as e:
+            logger.warning(f"⚠️ [Enrollment] 清除选课缓存失败: {e}")
@@ -1,12 +1,84 @@
 # app/services/es_sync.py
+import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from elasticsearch.helpers import async_bulk
+from app.config import settings
 from app.core.es import ESClient
 from app.models.course import Course
+from app.models.user import User
+from app.schemas.course import CourseSearchFilter
+from app.services.vector_db import VectorDBService
+
+logger = logging.getLogger(__name__)
 
 
 class CourseESService:
     INDEX_NAME = "pylab_courses"
 
+    # 价格分面的区间 (from 含, to 不含; None 表示不限)
+    PRICE_FACET_RANGES = [(0, 50), (50, 100), (100, 200), (200, None)]
+    # 创建时间分面: 最近 N 天
+    CREATED_FACET_DAYS = [7, 30, 365]
+    TEACHER_FACET_SIZE = 10
+
+    # 课程表字段 -> 依赖它的 ES 文档字段
+    # signals.py 据此判断保存课程后是否需要同步 ES，消费者据此做局部更新
+    # (view_count 不在这里: 浏览量由 ViewCounterService 落库时直接批量推到 ES，不走保存信号)
+    INDEXED_FIELDS = {
+        "title": ("title", "title_suggest"),
+        "desc": ("desc",),
+        "cover": ("cover",),
+        "price": ("price",),
+        "teacher_id": ("teacher_id", "teacher_name"),
+        "is_published": ("is_published", "title_suggest"),
+        "created_at": ("created_at",),
+    }
+
+    # 课程卡片需要的 _source 字段 (与 CourseCardOut 对应)，COURSE_LIST_FROM_ES 开启时列表直接用它渲染
+    CARD_SOURCE_FIELDS = (
+        "id", "title", "desc", "cover", "price", "teacher_id", "is_published", "created_at", "view_count",
+        "teacher_name",
+    )
+
+    @classmethod
+    def _vector_mapping(cls) -> dict:
+        """[混合检索模式] 课程向量字段，维度与 pgvector 列一致"""
+        return {
+            "embedding": {
+                "type": "dense_vector",
+                "dims": VectorDBService.EMBEDDING_DIM,
+                "index": True,
+                "similarity": "cosine"
+            }
+        }
+
+    @classmethod
+    def _suggest_mapping(cls) -> dict:
+        """
+        搜索框联想: completion 字段 (FST 常驻内存，前缀查询毫秒级)
+        只有已发布课程写入该字段，所以联想结果不需要再按发布状态过滤
+        """
+        return {
+            "title_suggest": {
+                "type": "completion",
+                "analyzer": "simple",
+                "preserve_separators": True,
+                "preserve_position_increments": True,
+                "max_input_length": 50
+            }
+        }
+
+    @classmethod
+    def _card_mapping(cls) -> dict:
+        """只用于渲染卡片、不参与检索的字段 (不建倒排索引)"""
+        return {
+            "cover": {"type": "keyword", "index": False},
+            "view_count": {"type": "integer"},
+            "teacher_name": {"type": "keyword", "index": False},
+        }
+
     @classmethod
     async def create_index(cls):
         """创建索引映射 (Mapping)"""
@@ -29,33 +101,281 @@ class CourseESService:
                         "search_analyzer": "ik_smart"
                     },
                     "price": {"type": "float"},
+                    "teacher_id": {"type": "integer"},
                     "is_published": {"type": "boolean"},
-                    "created_at": {"type": "date"}
+                    "created_at": {"type": "date"},
+                    **cls._card_mapping(),
+                    **cls._suggest_mapping()
                 }
             }
+            if settings.ES_HYBRID_SEARCH:
+                mapping["properties"].update(cls._vector_mapping())
             await client.indices.create(index=cls.INDEX_NAME, mappings=mapping)
             print(f"✅ [ES] 索引 {cls.INDEX_NAME} 创建成功")
+        else:
+            # 老索引: 新增字段可以直接 put_mapping，无需重建索引 (已有文档重新同步后才有数据)
+            properties = {"teacher_id": {"type": "integer"}, **cls._card_mapping(), **cls._suggest_mapping()}
+            if settings.ES_HYBRID_SEARCH:
+                properties.update(cls._vector_mapping())
+            await client.indices.put_mapping(index=cls.INDEX_NAME, properties=properties)
+            print(f"✅ [ES] 索引 {cls.INDEX_NAME} 字段映射检查完成")
+
+    @staticmethod
+    def _suggest_doc(title: str, view_count: Optional[int]) -> dict:
+        # 联想词: 浏览量作为权重，热门课程排在前面
+        return {"input": [title], "weight": max(int(view_count or 0), 0)}
 
     @classmethod
-    async def sync_course(cls, course: Course):
-        """同步单个课程到 ES"""
-        client = ESClient.get()
+    async def teacher_names(cls, teacher_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """批量查讲师显示名 (昵称，没有昵称用用户名)，一次查询"""
+        teacher_ids = list(set(teacher_ids))
+        if not teacher_ids:
+            return {}
+        users = await User.filter(id__in=teacher_ids).only("id", "nickname", "username")
+        return {u.id: u.display_name for u in users}
 
-        # 构造文档
+    @classmethod
+    def build_doc(cls, course: Course, embedding: Optional[List[float]] = None,
+                  teacher_name: Optional[str] = None) -> dict:
+        """构造 ES 文档 (除检索字段外还带上渲染课程卡片需要的字段)"""
         doc = {
             "id": course.id,
             "title": course.title,
             "desc": course.desc or "",
+            "cover": course.cover,
             "price": float(course.price) if course.price else 0.0,
+            "teacher_id": course.teacher_id,
+            "teacher_name": teacher_name,
             "is_published": course.is_published,
+            # 浏览量快照 (之后由 ViewCounterService 落库时刷新)
+            "view_count": int(course.view_count or 0),
             # 处理时间格式
             "created_at": course.created_at.isoformat() if course.created_at else datetime.now().isoformat()
         }
+        if course.is_published:
+            doc["title_suggest"] = cls._suggest_doc(course.title, course.view_count)
+        # 向量只在混合检索模式下写入 (否则会被动态映射成普通 float 数组，之后也无法再映射成 dense_vector)
+        if embedding and settings.ES_HYBRID_SEARCH:
+            doc["embedding"] = embedding
+        return doc
+
+    @classmethod
+    def build_partial_doc(cls, course: Course, fields: Iterable[str],
+                          embedding: Optional[List[float]] = None, teacher_name: Optional[str] = None) -> dict:
+        """局部更新文档: 只包含受 fields 影响的 ES 字段 (下架时 title_suggest 置空，联想里不再出现)"""
+        full = cls.build_doc(course, embedding, teacher_name)
+        doc = {}
+        for field in fields:
+            for key in cls.INDEXED_FIELDS.get(field, ()):
+                doc[key] = full.get(key)
+        if "embedding" in full:
+            doc["embedding"] = full["embedding"]
+        return doc
+
+    @classmethod
+    async def _get_course_embedding(cls, course: Course) -> Optional[List[float]]:
+        """
+        [混合检索模式] 课程向量: 优先复用 pgvector 列里已经算好的，没有再现算
+        """
+        embeddings = await VectorDBService.get_course_embeddings([course.id])
+        if course.id in embeddings:
+            return embeddings[course.id]
+        return await VectorDBService.get_embedding(
+            VectorDBService.course_text(course.title, course.desc),
+            use_cache=False
+        )
+
+    @classmethod
+    async def sync_course(cls, course: Course):
+        """同步单个课程到 ES"""
+        client = ESClient.get()
+
+        # 构造文档 (混合检索模式下把课程向量一起写进去)
+        embedding = None
+        if settings.ES_HYBRID_SEARCH:
+            embedding = await cls._get_course_embedding(course)
+        names = await cls.teacher_names([course.teacher_id])
+        doc = cls.build_doc(course, embedding, names.get(course.teacher_id))
 
         # Upsert: 存在则更新，不存在则写入
         await client.index(index=cls.INDEX_NAME, id=str(course.id), document=doc)
         print(f"📡 [ES Sync] 已同步课程: {course.title}")
 
+    @classmethod
+    async def build_bulk_actions(
+            cls,
+            courses: List[Course],
+            compute_missing: bool = False,
+            partial_fields: Optional[Dict[int, Set[str]]] = None,
+            embeddings: Optional[Dict[int, List[float]]] = None
+    ) -> List[dict]:
+        """
+        批量构造 bulk 动作
+        一次查出这批课程的讲师显示名；混合检索模式下一次查出这批课程在 pgvector 里的向量
+        :param compute_missing: 还没有向量的课程是否现算 (一次批量请求 Ollama)；
+                                为 False 时先不带向量，跑 refresh_vectors 后再同步
+        :param partial_fields: {课程ID: 变化的字段}，在里面的课程只做局部更新 (update)，其余整篇写入 (index)
+        :param embeddings: 调用方已经算好的向量 (比如刚重新生成的)，优先使用；只在混合检索模式下写入 ES
+        """
+        partial_fields = partial_fields or {}
+        # changed: 调用方传入的新向量 (局部更新时只有它们需要写进 doc)
+        changed = dict(embeddings or {}) if settings.ES_HYBRID_SEARCH else {}
+        embeddings = dict(changed)
+        if settings.ES_HYBRID_SEARCH:
+            # 整篇写入和局部更新的 upsert 都需要完整向量，没传的从 pgvector 读
+            need = [c for c in courses if c.id not in embeddings]
+            if need:
+                embeddings.update(await VectorDBService.get_course_embeddings([c.id for c in need]))
+            missing = [c for c in need if c.id not in embeddings]
+            if compute_missing and missing:
+                vectors = await VectorDBService.get_embeddings(
+                    [VectorDBService.course_text(c.title, c.desc) for c in missing]
+                )
+                embeddings.update({c.id: v for c, v in zip(missing, vectors) if v})
+
+        names = await cls.teacher_names(c.teacher_id for c in courses)
+
+        actions = []
+        for c in courses:
+            fields = partial_fields.get(c.id)
+            name = names.get(c.teacher_id)
+            if fields:
+                actions.append({
+                    "_op_type": "update",
+                    "_index": cls.INDEX_NAME,
+                    "_id": str(c.id),
+                    # 向量没变的局部更新不带向量
+                    "doc": cls.build_partial_doc(c, fields, changed.get(c.id), name),
+                    # ES 里还没有这篇文档 (之前同步失败过) 时直接写入完整文档
+                    "upsert": cls.build_doc(c, embeddings.get(c.id), name),
+                })
+            else:
+                actions.append({
+                    "_op_type": "index",
+                    "_index": cls.INDEX_NAME,
+                    "_id": str(c.id),
+                    "_source": cls.build_doc(c, embeddings.get(c.id), name),
+                })
+        return actions
+
+    @classmethod
+    async def bulk_sync(
+            cls,
+            courses: List[Course],
+            delete_ids: Iterable[int] = (),
+            compute_missing: bool = False,
+            partial_fields: Optional[Dict[int, Set[str]]] = None,
+            embeddings: Optional[Dict[int, List[float]]] = None
+    ) -> Tuple[int, int]:
+        """
+        批量同步 (写入 + 局部更新 + 删除合并成一次 _bulk 请求，不逐条打印)
+        :param delete_ids: 需要从 ES 删除的课程ID (本来就不存在的忽略)
+        :param partial_fields / embeddings: 见 build_bulk_actions
+        :return: (成功数, 失败数)
+        """
+        actions = await cls.build_bulk_actions(
+            courses, compute_missing, partial_fields, embeddings
+        ) if courses else []
+        actions += [
+            {"_op_type": "delete", "_index": cls.INDEX_NAME, "_id": str(course_id)}
+            for course_id in delete_ids
+        ]
+        if not actions:
+            return 0, 0
+        success, errors = await async_bulk(
+            ESClient.get(), actions, chunk_size=len(actions), raise_on_error=False, ignore_status=(404,)
+        )
+        for error in errors[:5]:
+            logger.warning(f"⚠️ [ES Bulk] 写入失败: {error}")
+        return success, len(errors)
+
+    @classmethod
+    async def update_view_counts(cls, rows: List[dict]) -> Tuple[int, int]:
+        """
+        把落库后的浏览量推到 ES (局部更新 view_count，已发布课程顺便刷新联想词权重)
+        :param rows: [{"id", "view_count", "title", "is_published"}, ...]
+        :return: (成功数, 失败数)；ES 里还没有的文档忽略
+        """
+        actions = []
+        for r in rows:
+            doc = {"view_count": int(r["view_count"] or 0)}
+            if r["is_published"]:
+                doc["title_suggest"] = cls._suggest_doc(r["title"], r["view_count"])
+            actions.append({"_op_type": "update", "_index": cls.INDEX_NAME, "_id": str(r["id"]), "doc": doc})
+        if not actions:
+            return 0, 0
+        success, errors = await async_bulk(
+            ESClient.get(), actions, chunk_size=len(actions), raise_on_error=False, ignore_status=(404,)
+        )
+        for error in errors[:5]:
+            logger.warning(f"⚠️ [ES Bulk] 浏览量更新失败: {error}")
+        return success, len(errors)
+
+    @classmethod
+    async def update_teacher_name(cls, teacher_id: int, teacher_name: Optional[str]) -> int:
+        """
+        讲师改了昵称: 按 teacher_id 批量改写该讲师所有课程文档里的 teacher_name (_update_by_query)
+        :return: 更新的文档数
+        """
+        resp = await ESClient.get().update_by_query(
+            index=cls.INDEX_NAME,
+            query={"term": {"teacher_id": teacher_id}},
+            script={
+                "source": "ctx._source.teacher_name = params.name",
+                "lang": "painless",
+                "params": {"name": teacher_name}
+            },
+            conflicts="proceed",
+            refresh=True
+        )
+        return resp.get("updated", 0)
+
+    @classmethod
+    async def get_cards(cls, course_ids: List[int]) -> Dict[int, dict]:
+        """
+        一次 mget 从 _source 取出课程卡片字段 (不查 Postgres)
+        :return: {课程ID: 卡片字典}；ES 里没有、或是还没补全卡片字段的旧文档不在结果里，由调用方回表
+        """
+        if not course_ids:
+            return {}
+        resp = await ESClient.get().mget(
+            index=cls.INDEX_NAME,
+            ids=[str(cid) for cid in course_ids],
+            source_includes=list(cls.CARD_SOURCE_FIELDS)
+        )
+        cards = {}
+        for doc in resp["docs"]:
+            source = doc.get("_source") if doc.get("found") else None
+            if source and all(field in source for field in cls.CARD_SOURCE_FIELDS):
+                cards[int(doc["_id"])] = source
+        return cards
+
+    @classmethod
+    @asynccontextmanager
+    async def bulk_load_settings(cls):
+        """
+        [运维] 全量导入期间: 关闭自动 refresh、副本数设为 0 (导完再复制一次，比边写边复制快)
+        退出时恢复原设置并手动 refresh 一次
+        """
+        client = ESClient.get()
+        resp = await client.indices.get_settings(index=cls.INDEX_NAME)
+        index_settings = next(iter(resp.values()))["settings"]["index"]
+        # refresh_interval 没显式设置过时恢复成 None (即 ES 默认值)
+        original = {
+            "refresh_interval": index_settings.get("refresh_interval"),
+            "number_of_replicas": index_settings.get("number_of_replicas", "1"),
+        }
+
+        await client.indices.put_settings(
+            index=cls.INDEX_NAME,
+            settings={"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+        )
+        try:
+            yield
+        finally:
+            await client.indices.put_settings(index=cls.INDEX_NAME, settings={"index": original})
+            await client.indices.refresh(index=cls.INDEX_NAME)
+
     @classmethod
     async def delete_course(cls, course_id: int):
         """从 ES 删除"""
@@ -63,12 +383,93 @@ class CourseESService:
         await client.delete(index=cls.INDEX_NAME, id=str(course_id), ignore=[404])
         print(f"🗑️ [ES Sync] 已删除课程 ID: {course_id}")
 
+    @staticmethod
+    def _filter_clauses(filters: Optional[CourseSearchFilter] = None) -> List[dict]:
+        """筛选条件 -> bool.filter 子句 (不参与打分，可被 ES 缓存)"""
+        clauses = [{"term": {"is_published": True}}]
+        if not filters:
+            return clauses
+
+        price = {}
+        if filters.price_min is not None:
+            price["gte"] = filters.price_min
+        if filters.price_max is not None:
+            price["lte"] = filters.price_max
+        if price:
+            clauses.append({"range": {"price": price}})
+
+        if filters.is_free is True:
+            clauses.append({"term": {"price": 0}})
+        elif filters.is_free is False:
+            clauses.append({"range": {"price": {"gt": 0}}})
+
+        if filters.teacher_id is not None:
+            clauses.append({"term": {"teacher_id": filters.teacher_id}})
+
+        created = {}
+        if filters.created_from:
+            created["gte"] = filters.created_from.isoformat()
+        if filters.created_to:
+            created["lte"] = filters.created_to.isoformat()
+        if created:
+            clauses.append({"range": {"created_at": created}})
+
+        return clauses
+
     @classmethod
-    async def search(cls, keyword: str):
-        """混合搜索 (暂时只演示关键词)"""
-        client = ESClient.get()
+    def _facet_aggs(cls) -> dict:
+        """分面统计 (和召回在同一次请求里完成，统计范围 = 当前关键词 + 筛选条件命中的课程)"""
+        return {
+            "is_free": {
+                "filters": {
+                    "filters": {
+                        "free": {"term": {"price": 0}},
+                        "paid": {"range": {"price": {"gt": 0}}}
+                    }
+                }
+            },
+            "price": {
+                "range": {
+                    "field": "price",
+                    "ranges": [
+                        {"key": f"{lo}-{hi or ''}", "from": lo, **({"to": hi} if hi else {})}
+                        for lo, hi in cls.PRICE_FACET_RANGES
+                    ]
+                }
+            },
+            "teacher": {"terms": {"field": "teacher_id", "size": cls.TEACHER_FACET_SIZE}},
+            "created": {
+                "date_range": {
+                    "field": "created_at",
+                    "ranges": [{"key": f"{d}d", "from": f"now-{d}d/d"} for d in cls.CREATED_FACET_DAYS]
+                }
+            }
+        }
+
+    @staticmethod
+    def _parse_facets(aggs: dict) -> dict:
+        """ES aggregations -> 前端用的分面计数"""
+        buckets = aggs.get("is_free", {}).get("buckets", {})
+        return {
+            "is_free": {key: b["doc_count"] for key, b in buckets.items()},
+            "price": [
+                {"key": b["key"], "from": b.get("from"), "to": b.get("to"), "count": b["doc_count"]}
+                for b in aggs.get("price", {}).get("buckets", [])
+            ],
+            "teacher": [
+                {"teacher_id": b["key"], "count": b["doc_count"]}
+                for b in aggs.get("teacher", {}).get("buckets", [])
+            ],
+            "created": [
+                {"key": b["key"], "count": b["doc_count"]}
+                for b in aggs.get("created", {}).get("buckets", [])
+            ],
+        }
 
-        query = {
+    @classmethod
+    def _keyword_query(cls, keyword: str, filters: Optional[CourseSearchFilter] = None) -> dict:
+        """关键词查询 (只搜已发布 + 筛选条件)"""
+        return {
             "bool": {
                 "must": [
                     {
@@ -80,12 +481,163 @@ class CourseESService:
                         }
                     }
                 ],
-                "filter": [
-                    {"term": {"is_published": True}}
-                ]
+                "filter": cls._filter_clauses(filters)
             }
         }
 
-        resp = await client.search(index=cls.INDEX_NAME, query=query)
-        # 提取 _source
-        return [h["_source"] for h in resp["hits"]["hits"]]
\ No newline at end of file
+    @classmethod
+    async def search(
+            cls,
+            keyword: str,
+            size: int = 10,
+            offset: int = 0,
+            search_after: Optional[list] = None,
+            ids_only: bool = False,
+            track_total_hits: Union[bool, int] = True,
+            filters: Optional[CourseSearchFilter] = None,
+            facets: bool = False
+    ) -> dict:
+        """
+        关键词搜索
+        :param size: 本次返回条数 (不传 ES 默认只给 10 条)
+        :param offset: from 分页 (浅分页用)
+        :param search_after: 深分页游标 (上一页返回的 next_cursor)，传了就忽略 offset
+        :param ids_only: 只返回 id + score (作为混合检索的召回路时使用)，不拉 _source
+        :param track_total_hits: True=精确总数, int=最多精确计到该值, False=不计算总数 (最快)
+        :param filters: 筛选条件 (下推到 bool.filter)
+        :param facets: 同一次请求里返回分面计数
+        :return: {"hits": [...], "total": int | None, "next_cursor": list | None, "facets": dict | None}
+        """
+        client = ESClient.get()
+
+        query = cls._keyword_query(keyword, filters)
+
+        params = {
+            "index": cls.INDEX_NAME,
+            "query": query,
+            "size": size,
+            # 相关度倒序，id 兜底保证排序稳定 (search_after 需要)
+            "sort": [{"_score": "desc"}, {"id": "asc"}],
+            "track_total_hits": track_total_hits,
+        }
+        if search_after:
+            params["search_after"] = search_after
+        elif offset:
+            params["from_"] = offset
+
+        if ids_only:
+            # 不要 _source，并且用 filter_path 裁掉响应里用不到的字段
+            params["source"] = False
+            params["filter_path"] = ["hits.hits._id", "hits.hits._score", "hits.hits.sort", "hits.total"]
+
+        if facets:
+            params["aggregations"] = cls._facet_aggs()
+            if "filter_path" in params:
+                params["filter_path"].append("aggregations")
+
+        resp = await client.search(**params)
+        raw_hits = resp.get("hits", {}).get("hits", [])
+
+        if ids_only:
+            hits = [{"id": int(h["_id"]), "score": h["_score"]} for h in raw_hits]
+        else:
+            hits = [{**h["_source"], "score": h["_score"]} for h in raw_hits]
+
+        total = None
+        if track_total_hits is not False:
+            total = resp.get("hits", {}).get("total", {}).get("value")
+
+        # 取满一页才可能还有下一页
+        next_cursor = raw_hits[-1]["sort"] if raw_hits and len(raw_hits) == size else None
+
+        return {
+            "hits": hits,
+            "total": total,
+            "next_cursor": next_cursor,
+            "facets": cls._parse_facets(resp.get("aggregations", {})) if facets else None
+        }
+
+    @classmethod
+    async def suggest(cls, prefix: str, size: int = 8) -> List[dict]:
+        """
+        标题前缀联想 (completion suggester，不走 BM25 / 向量)
+        :return: [{"id": 课程ID, "title": 标题}, ...] 按权重排序
+        """
+        client = ESClient.get()
+        resp = await client.search(
+            index=cls.INDEX_NAME,
+            size=0,
+            source=["title"],
+            suggest={
+                "title": {
+                    "prefix": prefix,
+                    "completion": {"field": "title_suggest", "size": size, "skip_duplicates": True}
+                }
+            },
+            filter_path=["suggest.title.options._id", "suggest.title.options._source"]
+        )
+        options = resp.get("suggest", {}).get("title", [{}])[0].get("options", [])
+        return [{"id": int(o["_id"]), "title": o["_source"]["title"]} for o in options]
+
+    @classmethod
+    async def hybrid_search(
+            cls,
+            keyword: str,
+            query_vector: List[float],
+            size: int = 50,
+            filters: Optional[CourseSearchFilter] = None,
+            facets: bool = False
+    ) -> dict:
+        """
+        [混合检索模式] 一次 ES 请求同时完成 BM25 + kNN 召回和融合
+        - rrf: ES 端 RRF (retriever 语法，需要 ES 8.14+)
+        - linear: query 与 knn 分数按权重线性相加 (所有版本/许可证可用)
+        筛选条件同时作用于 BM25 查询和 kNN 的 pre-filter
+        :return: {"hits": [{"id": 课程ID, "score": 融合分数}, ...] 已排好序, "facets": dict | None}
+        """
+        client = ESClient.get()
+
+        text_query = cls._keyword_query(keyword, filters)
+        knn = {
+            "field": "embedding",
+            "query_vector": query_vector,
+            "k": size,
+            "num_candidates": max(100, size * 2),
+            "filter": cls._filter_clauses(filters)
+        }
+
+        params = {
+            "index": cls.INDEX_NAME,
+            "size": size,
+            "source": False,
+            "filter_path": ["hits.hits._id", "hits.hits._score"],
+        }
+        if facets:
+            params["aggregations"] = cls._facet_aggs()
+            params["filter_path"].append("aggregations")
+
+        if settings.ES_HYBRID_MODE == "rrf":
+            params["retriever"] = {
+                "rrf": {
+                    "retrievers": [
+                        {"standard": {"query": text_query}},
+                        {"knn": knn}
+                    ],
+                    "rank_window_size": size,
+                    "rank_constant": settings.ES_HYBRID_RRF_K
+                }
+            }
+        else:
+            text_query["bool"]["boost"] = settings.ES_HYBRID_KEYWORD_BOOST
+            knn["boost"] = settings.ES_HYBRID_VECTOR_BOOST
+            params["query"] = text_query
+            params["knn"] = knn
+
+        resp = await client.search(**params)
+        return {
+            "hits": [
+                {"id": int(h["_id"]), "score": h["_score"]}
+                for h in resp.get("hits", {}).get("hits", [])
+            ],
+            "facets": cls._parse_facets(resp.get("aggregations", {})) if facets else None
+        }
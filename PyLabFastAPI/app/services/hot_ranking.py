@@ -0,0 +1,153 @@
+# app/services/hot_ranking.py
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from app.core.redis_client import RedisClient
+from app.models.course import Course
+
+logger = logging.getLogger(__name__)
+
+
+class HotRankingService:
+    """
+    课程热度榜 (Redis ZSET，带时间衰减)
+
+    热度 = Σ 权重 × 2^(-(now - 事件时间) / 半衰期)
+    所有课程的分数同时衰减，排名只取决于相对大小，所以等价于存
+        Σ 权重 × 2^((事件时间 - epoch) / 半衰期)
+    每来一个事件只需一次 ZINCRBY，不用定时重算全表。
+    分数随时间指数增长，超过 REBASE_EXPONENT 个半衰期后把 epoch 往后挪并整体缩放一次 (rebase)。
+    读 epoch 和写分数在同一个 Lua 脚本里完成 (rebase 也是)，不会拿旧 epoch 算出的分数写进缩放后的榜单。
+    """
+    KEY = "course:hot"
+    EPOCH_KEY = "course:hot:epoch"
+    LOCK_KEY = "course:hot:lock"
+
+    HALF_LIFE = 3 * 24 * 3600  # 半衰期: 3 天
+    VIEW_WEIGHT = 1.0
+    ENROLL_WEIGHT = 10.0
+    REBASE_EXPONENT = 64
+
+    # KEYS: [榜单, epoch]  ARGV: [当前时间, 半衰期, ZADD 选项, 课程ID1, 权重1, 事件时间1, ...]
+    # 按 Redis 里的 epoch 算出加权分数后写入，返回 epoch (没有 epoch 时以当前时间初始化)
+    _ZADD_BOOSTED_LUA = """
+    local epoch = tonumber(redis.call('GET', KEYS[2]))
+    if not epoch then
+        epoch = tonumber(ARGV[1])
+        redis.call('SET', KEYS[2], ARGV[1])
+    end
+    local half_life = tonumber(ARGV[2])
+    for i = 4, #ARGV, 3 do
+        local score = tonumber(ARGV[i + 1]) * 2 ^ ((tonumber(ARGV[i + 2]) - epoch) / half_life)
+        if ARGV[3] == 'XX' then
+            redis.call('ZADD', KEYS[1], 'XX', 'INCR', score, ARGV[i])
+        else
+            redis.call('ZADD', KEYS[1], 'NX', score, ARGV[i])
+        end
+    end
+    return tostring(epoch)
+    """
+
+    # KEYS: [榜单, epoch]  ARGV: [当前时间, 半衰期]
+    # 把 epoch 挪到当前时间，所有分数等比缩小 (排名不变，不移除任何课程)
+    _REBASE_LUA = """
+    local epoch = tonumber(redis.call('GET', KEYS[2]))
+    if not epoch then
+        return 0
+    end
+    local factor = 2 ^ ((epoch - tonumber(ARGV[1])) / tonumber(ARGV[2]))
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', factor)
+    redis.call('SET', KEYS[2], ARGV[1])
+    return 1
+    """
+
+    @classmethod
+    async def _zadd_boosted(cls, option: str, events: List[Tuple[int, float, float]]) -> float:
+        """
+        按 Redis 里当前的 epoch 写入加权分数 (原子操作)
+        :param option: XX (只给已在榜单里的课程加分) / NX (只添加不在榜单里的课程)
+        :param events: [(课程ID, 权重, 事件时间), ...]
+        :return: 当前 epoch
+        """
+        args = [time.time(), cls.HALF_LIFE, option]
+        for course_id, weight, ts in events:
+            args += [str(course_id), weight, ts]
+        script = RedisClient.get().register_script(cls._ZADD_BOOSTED_LUA)
+        return float(await script(keys=[cls.KEY, cls.EPOCH_KEY], args=args))
+
+    @classmethod
+    async def record(cls, course_id: int, weight: float):
+        """
+        记录一次热度事件 (浏览 / 加入学习)
+        XX: 只给已在榜单里的课程加分 (课程发布时 add_course 入榜)，未发布/不存在的课程不会混进来
+        """
+        now = time.time()
+        epoch = await cls._zadd_boosted("XX", [(course_id, weight, now)])
+
+        if (now - epoch) / cls.HALF_LIFE > cls.REBASE_EXPONENT:
+            await cls.rebase()
+
+    @classmethod
+    async def rebase(cls):
+        """把 epoch 挪到当前时间，所有分数等比缩小 (排名不变)"""
+        client = RedisClient.get()
+        if not await client.set(cls.LOCK_KEY, "1", nx=True, ex=60):
+            return
+
+        try:
+            # 不移除分数很低的课程: record() 只给已在榜单里的课程加分，移出去就回不来了
+            script = client.register_script(cls._REBASE_LUA)
+            if await script(keys=[cls.KEY, cls.EPOCH_KEY], args=[time.time(), cls.HALF_LIFE]):
+                logger.info("🔥 [Hot] 热度榜已 rebase")
+        finally:
+            await client.delete(cls.LOCK_KEY)
+
+    @classmethod
+    def _seed_event(cls, course: Course) -> Tuple[int, float, float]:
+        """冷启动分数: 把历史浏览量当作发生在课程创建时刻"""
+        created = course.created_at.timestamp() if course.created_at else time.time()
+        return course.id, (course.view_count or 0) * cls.VIEW_WEIGHT, created
+
+    @classmethod
+    async def add_course(cls, course: Course):
+        """课程发布: 进入榜单 (已在榜单中则保持原分数)"""
+        await cls._zadd_boosted("NX", [cls._seed_event(course)])
+
+    @classmethod
+    async def remove_course(cls, course_id: int):
+        """课程下架/删除: 移出榜单"""
+        await RedisClient.get().zrem(cls.KEY, str(course_id))
+
+    @classmethod
+    async def rebuild(cls, batch_size: int = 1000):
+        """用数据库里已发布课程的浏览量重建榜单 (Redis 数据丢失 / 首次上线时)"""
+        client = RedisClient.get()
+        if not await client.set(cls.LOCK_KEY, "1", nx=True, ex=300):
+            return
+
+        try:
+            last_id = 0
+            while True:
+                courses = await Course.filter(is_published=True, id__gt=last_id) \
+                    .order_by("id").limit(batch_size) \
+                    .only("id", "view_count", "created_at")
+                if not courses:
+                    break
+                await cls._zadd_boosted("NX", [cls._seed_event(c) for c in courses])
+                last_id = courses[-1].id
+            logger.info("🔥 [Hot] 热度榜已重建")
+        finally:
+            await client.delete(cls.LOCK_KEY)
+
+    @classmethod
+    async def top(cls, offset: int, limit: int) -> Optional[List[int]]:
+        """
+        按热度倒序取一页课程ID
+        :return: None 表示榜单不存在 (调用方应回退到数据库排序)
+        """
+        client = RedisClient.get()
+        ids = await client.zrevrange(cls.KEY, offset, offset + limit - 1)
+        if not ids and offset == 0 and not await client.exists(cls.KEY):
+            return None
+        return [int(i) for i in ids]
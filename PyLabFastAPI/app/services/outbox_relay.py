@@ -0,0 +1,137 @@
+# app/services/outbox_relay.py
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from tortoise import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from app.core.mq import RabbitMQClient
+from app.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    发件箱投递 (at-least-once)
+    - 写入方: OutboxRelay.enqueue() 和业务数据在同一个事务里写 outbox_events，请求路径上不再等 RabbitMQ
+    - 投递方: 后台循环批量取出待投递事件 (FOR UPDATE SKIP LOCKED，多进程不会重复取)，
+              带 publisher confirm 批量发布，全部确认后标记 sent_at；失败整批回滚，下一轮重试
+    消费者需要幂等 (ES 同步本身就是幂等的)
+    """
+    BATCH_SIZE = 200
+    POLL_INTERVAL = 1.0  # 秒
+    # 已投递的事件保留多久 (方便排查)，之后定期清理
+    RETENTION_HOURS = 24
+    PURGE_INTERVAL = 3600  # 秒
+
+    _wakeup: Optional[asyncio.Event] = None
+
+    @classmethod
+    async def init(cls):
+        """只给待投递的行建部分索引，投递方的查询只扫这一小部分"""
+        conn = OutboxEvent._meta.db
+        await conn.execute_query(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_events_pending ON outbox_events (id) WHERE sent_at IS NULL;"
+        )
+
+    @classmethod
+    async def enqueue(cls, routing_key: str, message: dict, using_db: Optional[BaseDBAsyncClient] = None):
+        """
+        写入一条待投递事件
+        :param using_db: 传入业务写入所在的连接/事务，两者一起提交或回滚
+        """
+        await OutboxEvent.create(routing_key=routing_key, payload=message, using_db=using_db)
+        # 本进程的投递循环提前醒来 (事务可能还没提交，没取到就等下一轮)
+        if cls._wakeup:
+            cls._wakeup.set()
+
+    @classmethod
+    async def relay_once(cls) -> int:
+        """
+        投递一批事件
+        :return: 本次投递成功的条数
+        """
+        error = None
+        async with in_transaction() as conn:
+            rows = await conn.execute_query_dict(
+                """
+                SELECT id, routing_key, payload
+                FROM outbox_events
+                WHERE sent_at IS NULL
+                ORDER BY id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED;
+                """,
+                [cls.BATCH_SIZE]
+            )
+            if not rows:
+                return 0
+
+            ids = [row["id"] for row in rows]
+            try:
+                await RabbitMQClient.publish_batch([
+                    (row["routing_key"], json.loads(row["payload"]) if isinstance(row["payload"], str) else row["payload"])
+                    for row in rows
+                ])
+            except Exception as e:
+                # 不在这里抛出: 事务正常结束 (没有写入)，释放行锁
+                error = e
+            else:
+                await conn.execute_query(
+                    "UPDATE outbox_events SET sent_at = now() WHERE id = ANY($1::bigint[]);", [ids]
+                )
+                return len(ids)
+
+        # 事务已结束，失败次数单独提交
+        await OutboxEvent._meta.db.execute_query(
+            "UPDATE outbox_events SET attempts = attempts + 1 WHERE id = ANY($1::bigint[]);", [ids]
+        )
+        raise error
+
+    @classmethod
+    async def purge(cls) -> int:
+        """清理已投递且超过保留期的事件"""
+        conn = OutboxEvent._meta.db
+        rows = await conn.execute_query_dict(
+            f"""
+            WITH deleted AS (
+                DELETE FROM outbox_events
+                WHERE sent_at IS NOT NULL AND sent_at < now() - interval '{int(cls.RETENTION_HOURS)} hours'
+                RETURNING 1
+            )
+            SELECT count(*) AS count FROM deleted;
+            """
+        )
+        return rows[0]["count"] if rows else 0
+
+    @classmethod
+    async def run(cls):
+        """后台循环 (在 lifespan 里启动)"""
+        cls._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        last_purge = loop.time()
+
+        while True:
+            try:
+                # 一批满了说明可能还有积压，接着投递
+                while await cls.relay_once() >= cls.BATCH_SIZE:
+                    pass
+
+                if loop.time() - last_purge > cls.PURGE_INTERVAL:
+                    last_purge = loop.time()
+                    purged = await cls.purge()
+                    if purged:
+                        logger.info(f"🧹 [Outbox] 已清理 {purged} 条过期事件")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ [Outbox] 事件投递失败，稍后重试: {e}")
+
+            cls._wakeup.clear()
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=cls.POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,122 @@
+# app/services/outline_cache.py
+import logging
+from typing import Optional
+
+import orjson
+
+from app.core.redis_client import RedisClient
+from app.models.course import Chapter, Lesson
+from app.services.cache_version import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+
+class CourseOutlineService:
+    """
+    课程大纲 (章节 + 课时) 缓存
+    - 每门课程一个版本号，章节/课时/挂载的视频和题目有任何变更都 bump
+    - 缓存的是序列化好的 JSON 字符串，命中时直接拼进响应体，不再经过 ORM 和 Pydantic
+    """
+    CACHE_TTL = 3600 * 24
+
+    @staticmethod
+    def _version_name(course_id: int) -> str:
+        return f"course_outline:{course_id}"
+
+    @classmethod
+    async def get_version(cls, course_id: int) -> str:
+        """当前大纲版本号 (也用于 ETag)"""
+        version, = await CacheVersion.get(cls._version_name(course_id))
+        return version
+
+    @classmethod
+    async def get_json(cls, course_id: int, version: Optional[str] = None) -> str:
+        """获取大纲 JSON (数组)，缓存未命中时现建并回填"""
+        cache_key: Optional[str] = None
+        try:
+            version = version or await cls.get_version(course_id)
+            cache_key = f"course:outline:{course_id}:{version}"
+            cached = await RedisClient.get().get(cache_key)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"⚠️ [Outline] 读取缓存失败: {e}")
+
+        outline = await cls.build_json(course_id)
+
+        if cache_key:
+            try:
+                await RedisClient.get().set(cache_key, outline, ex=cls.CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"⚠️ [Outline] 写入缓存失败: {e}")
+        return outline
+
+    @classmethod
+    async def build_json(cls, course_id: int) -> str:
+        """
+        两次查询构建大纲: 章节一次，课时 (LEFT JOIN 视频/题目，只取前端用到的列) 一次
+        """
+        chapters = await Chapter.filter(course_id=course_id) \
+            .order_by("rank", "id") \
+            .values("id", "title", "rank")
+
+        lessons = await Lesson.filter(chapter__course_id=course_id) \
+            .order_by("rank", "id") \
+            .values(
+                "id", "title", "type", "rank", "chapter_id", "video_id", "problem_id",
+                "video__title", "video__file_key", "video__play_url", "video__duration",
+                "problem__title", "problem__content", "problem__init_code",
+                "problem__time_limit", "problem__memory_limit",
+            )
+
+        chapter_map = {c["id"]: {**c, "lessons": []} for c in chapters}
+        for l in lessons:
+            chapter = chapter_map.get(l["chapter_id"])
+            if chapter is None:
+                continue
+
+            video = None
+            if l["video_id"]:
+                video = {
+                    "id": l["video_id"],
+                    "title": l["video__title"],
+                    "file_key": l["video__file_key"],
+                    "play_url": l["video__play_url"],
+                    "duration": l["video__duration"],
+                }
+
+            problem = None
+            if l["problem_id"]:
+                # CourseEditor 编辑题目课时会回填这些字段
+                problem = {
+                    "id": l["problem_id"],
+                    "title": l["problem__title"],
+                    "content": l["problem__content"],
+                    "init_code": l["problem__init_code"],
+                    "time_limit": l["problem__time_limit"],
+                    "memory_limit": l["problem__memory_limit"],
+                }
+
+            chapter["lessons"].append({
+                "id": l["id"],
+                "title": l["title"],
+                "type": l["type"],
+                "rank": l["rank"],
+                "video": video,
+                "problem": problem,
+                "problem_id": l["problem_id"],
+            })
+
+        data = [chapter_map[c["id"]] for c in chapters]
+        return orjson.dumps(data, default=str).decode("utf-8")
+
+    @classmethod
+    async def invalidate(cls, *course_ids: int):
+        """课程大纲有变更 (由 signals.py 调用)"""
+        ids = {cid for cid in course_ids if cid}
+        if not ids:
+            return
+        try:
+            await CacheVersion.bump(*(cls._version_name(cid) for cid in ids))
+        except Exception as e:
+            logger.warning(f"⚠️ [Outline] 缓存失效失败: {e}")
@@ -1,42 +1,69 @@
 # PyLabFastAPI/app/services/vector_db.py
-import httpx
+import json
+from typing import Dict, List, Optional, Set
 from tortoise import fields, models
+from tortoise.transactions import in_transaction
+from app.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_client import EmbeddingClient
 
 
 class VectorDBService:
-    # 配置 Ollama 地址 (确保你本地装了 ollama 且 pull 了 nomic-embed-text)
-    OLLAMA_URL = "http://localhost:11434/api/embeddings"
+    # 确保你本地装了 ollama 且 pull 了 nomic-embed-text (地址见 EmbeddingClient.OLLAMA_URL)
     MODEL_NAME = "nomic-embed-text"
+    EMBEDDING_DIM = 768
+    # 课程向量的源字段 (见 course_text)，只有这些字段变了才需要重新生成向量
+    EMBEDDING_SOURCE_FIELDS = frozenset({"title", "desc"})
 
     @classmethod
-    async def get_embedding(cls, text: str):
+    async def get_embedding(cls, text: str, use_cache: bool = True):
         """
         调用本地 Ollama 生成向量
+        :param use_cache: 是否走查询向量缓存 (L1 进程内 LRU + L2 Redis)。
+                          课程全文这类一次性长文本建议传 False，避免挤占缓存
         """
         if not text:
             return None
 
+        if use_cache:
+            text = EmbeddingCache.normalize(text)
+            cached = await EmbeddingCache.get(cls.MODEL_NAME, text)
+            if cached is not None:
+                return cached
+
+        embedding = await cls._request_embedding(text)
+        if embedding and use_cache:
+            await EmbeddingCache.set(cls.MODEL_NAME, text, embedding)
+        return embedding
+
+    @classmethod
+    async def _request_embedding(cls, text: str):
+        """请求 Ollama (不走缓存，并发请求会被 EmbeddingClient 合并成批)"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    cls.OLLAMA_URL,
-                    json={
-                        "model": cls.MODEL_NAME,
-                        "prompt": text
-                    },
-                    timeout=30.0
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("embedding")
-                else:
-                    print(f"⚠️ Ollama Error: {response.text}")
-                    return None
+            return await EmbeddingClient.embed(text, cls.MODEL_NAME)
         except Exception as e:
             print(f"❌ 连接 Ollama 失败: {e}")
             return None
 
+    @classmethod
+    async def get_embeddings(cls, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        [批量任务专用] 批量生成向量 (不走缓存)
+        整批失败时返回全 None 列表，调用方按单条失败处理
+        """
+        if not texts:
+            return []
+        try:
+            return await EmbeddingClient.embed_many(texts, cls.MODEL_NAME)
+        except Exception as e:
+            print(f"❌ 批量生成向量失败: {e}")
+            return [None] * len(texts)
+
+    @staticmethod
+    def course_text(title: str, desc: Optional[str]) -> str:
+        """课程向量的源文本: 标题 + 简介"""
+        return f"{title} {desc or ''}"
+
     # === [核心修复] 新增了 update_course_embedding 方法 ===
     @classmethod
     async def update_course_embedding(cls, course_id: int, title: str, desc: str):
@@ -46,34 +73,111 @@ class VectorDBService:
         print(f"🧠 [AI] 正在为课程 {course_id} 生成向量索引...")
 
         # 1. 拼接文本 (标题 + 简介)
-        text = f"{title} {desc or ''}"
+        text = cls.course_text(title, desc)
 
         # 2. 获取向量
-        embedding = await cls.get_embedding(text)
+        embedding = await cls.get_embedding(text, use_cache=False)
 
         if not embedding:
             print(f"⚠️ 课程 {course_id} 向量生成失败，跳过索引")
             return
 
+        await cls.save_course_embedding(course_id, embedding)
+
+        # 向量变了，增量更新相似课程推荐
+        from app.services.course_neighbors import CourseNeighborService
+        await CourseNeighborService.refresh_affected(course_id)
+
+    @classmethod
+    async def update_course_embeddings(cls, courses) -> Dict[int, List[float]]:
+        """
+        [批量] 重新生成一批课程的向量并存入数据库 (一次 Ollama 批量请求)
+        :return: {课程ID: 新向量} (生成失败的课程不在结果里)
+        """
+        if not courses:
+            return {}
+        vectors = await cls.get_embeddings([cls.course_text(c.title, c.desc) for c in courses])
+        embeddings = {c.id: v for c, v in zip(courses, vectors) if v}
+        await cls.save_course_embeddings(embeddings)
+
+        # 向量变了，增量更新相似课程推荐
+        from app.services.course_neighbors import CourseNeighborService
+        await CourseNeighborService.refresh_affected_many(list(embeddings))
+        return embeddings
+
+    @classmethod
+    async def save_course_embedding(cls, course_id: int, embedding: List[float]):
+        """把向量写回 courses.embedding 列"""
         from app.models.course import Course
         conn = Course._meta.db
 
         try:
-            # 3. 使用原生 SQL 更新
+            # 使用原生 SQL 更新
             # 因为 embedding 字段是通过 ALTER TABLE 加的，Tortoise 模型里没有定义它
             # pgvector 接受字符串格式的数组: '[0.1, 0.2, ...]'
-            embedding_str = str(embedding)
-
-            sql = f"UPDATE courses SET embedding = '{embedding_str}' WHERE id = {course_id}"
-            await conn.execute_query(sql)
+            sql = "UPDATE courses SET embedding = $1::text::vector WHERE id = $2"
+            await conn.execute_query(sql, [cls._to_pgvector(embedding), course_id])
             print(f"✅ 课程 {course_id} 向量索引构建完成")
         except Exception as e:
             print(f"❌ 向量存入数据库失败: {e}")
 
+    @classmethod
+    async def save_course_embeddings(cls, embeddings: Dict[int, List[float]]):
+        """[批量] 把一批向量写回 courses.embedding 列 (一条 UPDATE ... FROM unnest)"""
+        if not embeddings:
+            return
+        from app.models.course import Course
+        conn = Course._meta.db
+
+        try:
+            sql = """
+                UPDATE courses AS c
+                SET embedding = v.embedding::vector
+                FROM unnest($1::int[], $2::text[]) AS v(id, embedding)
+                WHERE c.id = v.id;
+            """
+            await conn.execute_query(sql, [
+                list(embeddings), [cls._to_pgvector(e) for e in embeddings.values()]
+            ])
+            print(f"✅ {len(embeddings)} 门课程向量索引构建完成")
+        except Exception as e:
+            print(f"❌ 向量批量存入数据库失败: {e}")
+
+    @classmethod
+    async def get_course_embeddings(cls, course_ids: List[int]) -> Dict[int, List[float]]:
+        """批量读取 courses.embedding 列里已经算好的向量 (没有向量的课程不在结果里)"""
+        if not course_ids:
+            return {}
+
+        from app.models.course import Course
+        conn = Course._meta.db
+
+        sql = """
+            SELECT id, embedding::text AS embedding
+            FROM courses
+            WHERE id = ANY($1::int[]) AND embedding IS NOT NULL;
+        """
+        rows = await conn.execute_query_dict(sql, [list(course_ids)])
+        # pgvector 文本格式 '[0.1,0.2,...]' 正好是合法 JSON
+        return {row["id"]: json.loads(row["embedding"]) for row in rows}
+
+    @classmethod
+    async def ids_without_embedding(cls, course_ids: List[int]) -> Set[int]:
+        """这批课程里还没有向量的课程ID (不读取向量本身)"""
+        if not course_ids:
+            return set()
+
+        from app.models.course import Course
+        conn = Course._meta.db
+
+        sql = "SELECT id FROM courses WHERE id = ANY($1::int[]) AND embedding IS NULL;"
+        rows = await conn.execute_query_dict(sql, [list(course_ids)])
+        return {row["id"] for row in rows}
+
     @classmethod
     async def init_vector_column(cls):
         """
-        初始化数据库向量字段 (pgvector)
+        初始化数据库向量字段 (pgvector) + ANN 索引
         """
         from app.models.course import Course
 
@@ -85,48 +189,201 @@ class VectorDBService:
             # 2. 添加字段 (如果不存在)
             # 注意: 维度必须匹配模型! nomic-embed-text 是 768
             await conn.execute_query(
-                "ALTER TABLE courses ADD COLUMN IF NOT EXISTS embedding vector(768);"
+                f"ALTER TABLE courses ADD COLUMN IF NOT EXISTS embedding vector({cls.EMBEDDING_DIM});"
             )
             print("✅ 向量数据库字段检查完成")
         except Exception as e:
             print(f"⚠️ 初始化向量字段跳过 (可能已存在或不支持): {e}")
+            return
+
+        try:
+            # 3. ANN 索引: 和配置 (类型 / 构建参数) 不一致的旧索引删掉重建，不存在则新建
+            if await cls._stale_vector_indexes():
+                await cls.rebuild_vector_index()
+            else:
+                await conn.execute_query(cls._index_ddl(concurrently=False))
+                print(f"✅ 向量索引检查完成 ({cls._index_name()})")
+        except Exception as e:
+            print(f"⚠️ 创建向量索引失败: {e}")
+
+    @classmethod
+    def _index_name(cls) -> str:
+        return f"idx_courses_embedding_{settings.VECTOR_INDEX_METHOD}"
 
     @classmethod
-    async def search_similar_courses(cls, query_text: str, limit: int = 20, threshold: float = 0.34):
+    def _index_params(cls) -> Dict[str, int]:
+        """当前配置下的索引构建参数"""
+        method = settings.VECTOR_INDEX_METHOD
+        if method == "hnsw":
+            return {"m": int(settings.VECTOR_HNSW_M), "ef_construction": int(settings.VECTOR_HNSW_EF_CONSTRUCTION)}
+        if method == "ivfflat":
+            return {"lists": int(settings.VECTOR_IVFFLAT_LISTS)}
+        raise ValueError(f"不支持的向量索引类型: {method}")
+
+    @classmethod
+    async def _stale_vector_indexes(cls) -> List[str]:
+        """
+        和当前配置不一致的向量索引: 名字/类型不对 (切换过 hnsw / ivfflat)、构建参数变了、
+        或上次 CONCURRENTLY 构建失败留下的无效索引
+        """
+        from app.models.course import Course
+        conn = Course._meta.db
+
+        rows = await conn.execute_query_dict(
+            """
+            SELECT c.relname AS name, am.amname AS method, c.reloptions AS options, i.indisvalid AS valid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE i.indrelid = 'courses'::regclass AND c.relname LIKE 'idx_courses_embedding_%';
+            """
+        )
+        expected = {k: str(v) for k, v in cls._index_params().items()}
+        stale = []
+        for row in rows:
+            options = dict(opt.split("=", 1) for opt in (row["options"] or []))
+            if (
+                row["name"] != cls._index_name()
+                or row["method"] != settings.VECTOR_INDEX_METHOD
+                or options != expected
+                or not row["valid"]
+            ):
+                stale.append(row["name"])
+        return stale
+
+    @classmethod
+    def _index_ddl(cls, concurrently: bool) -> str:
+        """
+        构造建索引语句
+        - 余弦距离 (<=>) 对应 vector_cosine_ops
+        - 部分索引 WHERE is_published = true: 搜索只查已发布课程，过滤条件直接和 ANN 排序合并在索引里
+        """
+        method = settings.VECTOR_INDEX_METHOD
+        params = ", ".join(f"{k} = {v}" for k, v in cls._index_params().items())
+
+        return f"""
+            CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS {cls._index_name()}
+            ON courses USING {method} (embedding vector_cosine_ops)
+            WITH ({params})
+            WHERE is_published = true;
+        """
+
+    @classmethod
+    async def rebuild_vector_index(cls):
+        """
+        修改了索引类型/构建参数后重建索引 (启动时 init_vector_column 检测到不一致会自动调用)
+        CONCURRENTLY 构建，不阻塞课程表的读写
+        """
+        from app.models.course import Course
+        conn = Course._meta.db
+
+        for method in ("hnsw", "ivfflat"):
+            await conn.execute_query(f"DROP INDEX CONCURRENTLY IF EXISTS idx_courses_embedding_{method};")
+        await conn.execute_query(cls._index_ddl(concurrently=True))
+        print(f"✅ 向量索引已重建 ({cls._index_name()})")
+
+    @classmethod
+    async def _ann_query(cls, sql: str, values: list, limit: int, filtered: bool = False) -> List[dict]:
+        """
+        在事务内设置本次查询的 ANN 搜索参数 (SET LOCAL 语义，只对当前事务生效)，再执行查询
+        :param filtered: 带额外筛选条件时，按配置开启 iterative scan (pgvector 0.8+)，
+                         避免索引扫描出的候选被过滤后不足 LIMIT 条
+        """
+        method = settings.VECTOR_INDEX_METHOD
+        if method == "hnsw":
+            # ef_search 小于 LIMIT 时 HNSW 最多只能返回 ef_search 条
+            gucs = [("hnsw.ef_search", max(settings.VECTOR_HNSW_EF_SEARCH, limit))]
+        else:
+            gucs = [("ivfflat.probes", settings.VECTOR_IVFFLAT_PROBES)]
+        if filtered and settings.VECTOR_ITERATIVE_SCAN:
+            gucs.append((f"{method}.iterative_scan", settings.VECTOR_ITERATIVE_SCAN))
+
+        async with in_transaction() as conn:
+            for guc, value in gucs:
+                await conn.execute_query("SELECT set_config($1, $2, true);", [guc, str(value)])
+            return await conn.execute_query_dict(sql, values)
+
+    @staticmethod
+    def _filter_sql(filters, start: int):
+        """
+        筛选条件 -> 追加到 WHERE 的 SQL 片段 + 参数 (占位符从 $start 开始编号)
+        :param filters: CourseSearchFilter，为空时不追加条件
+        """
+        clauses, values = [], []
+        if not filters:
+            return "", values
+
+        def add(condition: str, value):
+            values.append(value)
+            clauses.append(condition.format(f"${start + len(values) - 1}"))
+
+        if filters.price_min is not None:
+            add("price >= {}", filters.price_min)
+        if filters.price_max is not None:
+            add("price <= {}", filters.price_max)
+        if filters.is_free is True:
+            clauses.append("price = 0")
+        elif filters.is_free is False:
+            clauses.append("price > 0")
+        if filters.teacher_id is not None:
+            add("teacher_id = {}", filters.teacher_id)
+        if filters.created_from:
+            add("created_at >= {}", filters.created_from)
+        if filters.created_to:
+            add("created_at <= {}", filters.created_to)
+
+        return "".join(f"\n                      AND {c}" for c in clauses), values
+
+    @staticmethod
+    def _to_pgvector(embedding: List[float]) -> str:
+        """pgvector 的文本格式: '[0.1,0.2,...]'"""
+        return "[" + ",".join(map(str, embedding)) + "]"
+
+    @classmethod
+    async def search_similar_courses(cls, query_text: str, limit: int = 20, threshold: float = 0.34,
+                                     raise_on_error: bool = False, filters=None):
         """
         [混合检索专用] 向量搜索 (仅搜索已发布的课程)
         :param query_text: 搜索关键词
         :param limit: 返回数量限制
         :param threshold: 距离阈值 (0.0=完全一样, 1.0=完全不同)。
                           建议值: 0.35~0.4。如果搜不到，调大；搜得太杂，调小。
+        :param raise_on_error: 为 True 时向量生成/查询失败直接抛异常 (混合检索据此判断降级)，
+                               否则吞掉异常返回空列表
+        :param filters: CourseSearchFilter 筛选条件，直接加在 ANN 子查询的 WHERE 里
         """
         # 1. 获取搜索词的向量
         embedding = await cls.get_embedding(query_text)
         if not embedding:
+            if raise_on_error:
+                raise RuntimeError("查询向量生成失败")
             return []
 
-        from app.models.course import Course
-        conn = Course._meta.db
-
-        embedding_str = str(embedding)
-
-        # 2. 构造 SQL
+        # 2. 构造 SQL (参数化，查询计划可复用)
         # 核心逻辑：
-        # - 计算余弦距离: embedding <=> '{embedding_str}'
-        # - 过滤: is_published = true (只搜已发布)
-        # - 过滤: distance < threshold (只搜距离足够近的)
+        # - 内层: ORDER BY distance LIMIT 走 ANN 索引 (部分索引已包含 is_published = true)，距离只算一次
+        # - 外层: distance < threshold 过滤 (只要距离足够近的)
+        # - 向量以文本参数传入再转 vector，避免拼接 768 维的字面量
+        # - 筛选条件下推到内层 WHERE (先过滤再取 LIMIT，不浪费召回名额)
+        filter_sql, filter_values = cls._filter_sql(filters, start=4)
         sql = f"""
-                SELECT id, title, "desc", cover, price,
-                       embedding <=> '{embedding_str}' as distance
-                FROM courses
-                WHERE is_published = true 
-                  AND (embedding <=> '{embedding_str}') < {threshold}
-                ORDER BY distance ASC
-                LIMIT {limit};
+                SELECT id, title, "desc", cover, price, distance
+                FROM (
+                    SELECT id, title, "desc", cover, price,
+                           embedding <=> $1::text::vector AS distance
+                    FROM courses
+                    WHERE is_published = true
+                      AND embedding IS NOT NULL{filter_sql}
+                    ORDER BY distance ASC
+                    LIMIT $2
+                ) AS ann
+                WHERE distance < $3
+                ORDER BY distance ASC;
             """
 
         try:
-            results = await conn.execute_query_dict(sql)
+            values = [cls._to_pgvector(embedding), limit, threshold, *filter_values]
+            results = await cls._ann_query(sql, values, limit, filtered=bool(filter_sql))
 
             # === 🔍 [调试日志] 打印真实距离，方便调参 ===
             # 正式上线后可以将这部分 print 注释掉
@@ -142,35 +399,38 @@ class VectorDBService:
             return results
         except Exception as e:
             print(f"❌ 向量搜索失败: {e}")
+            if raise_on_error:
+                raise
             return []
 
     @classmethod
-    async def search_similar_by_id(cls, course_id: int, limit: int = 5):
+    async def search_similar_by_id(cls, course_id: int, limit: int = 5, raise_on_error: bool = False):
         """
         [🚀 极速版] 直接利用数据库里已有的向量进行搜索 (无需调用 Ollama)
-        原理：Postgres 内部子查询，速度极快
+        原理：标量子查询先取出当前课程的向量 (InitPlan，只执行一次)，外层走 ANN 索引排序
+        :param raise_on_error: 为 True 时查询失败直接抛异常，否则返回空列表
         """
-        from app.models.course import Course
-        conn = Course._meta.db
-
         # SQL 逻辑：
-        # 1. (SELECT embedding FROM courses WHERE id = {course_id}) -> 取出当前课程存好的向量
-        # 2. embedding <=> (...) -> 计算距离
-        # 3. WHERE id != {course_id} -> 排除自己
-        sql = f"""
+        # 1. (SELECT embedding FROM courses WHERE id = $1) -> 取出当前课程存好的向量
+        # 2. embedding <=> (...) AS distance -> 距离只算一次，ORDER BY 直接用
+        # 3. WHERE id != $1 AND is_published = true -> 排除自己和未发布的课程 (命中部分索引)
+        sql = """
                 SELECT id, title, "desc", cover, price, view_count,
-                       embedding <=> (SELECT embedding FROM courses WHERE id = {course_id}) as distance
+                       embedding <=> (SELECT embedding FROM courses WHERE id = $1) AS distance
                 FROM courses
-                WHERE id != {course_id} 
+                WHERE id != $1
+                  AND is_published = true
                   AND embedding IS NOT NULL
                 ORDER BY distance ASC
-                LIMIT {limit};
+                LIMIT $2;
             """
 
         try:
             # execute_query_dict 会返回字典列表，刚好给前端用
-            results = await conn.execute_query_dict(sql)
+            results = await cls._ann_query(sql, [course_id, limit], limit)
             return results
         except Exception as e:
             print(f"❌ 数据库内向量搜索失败: {e}")
-            return []
\ No newline at end of file
+            if raise_on_error:
+                raise
+            return []
@@ -0,0 +1,142 @@
+# app/services/view_counter.py
+import asyncio
+import logging
+import uuid
+from tortoise.transactions import in_transaction
+from app.core.redis_client import RedisClient
+from app.services.es_sync import CourseESService
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounterService:
+    """
+    课程浏览量 Write-Behind 计数器
+    - 每次浏览只在 Redis 里 HINCRBY，不写数据库 (也不会触发 post_save -> ES 同步)
+    - 后台任务定期把累积的增量批量 UPDATE 回 Postgres，并把新的浏览量推到 ES (卡片里的浏览量 / 联想词权重)
+    - 每批增量带一个 token，和 UPDATE 同一个事务写入 course_view_flushes，重复 flush 同一批不会重复累加
+    """
+    PENDING_KEY = "course:views:pending"
+    FLUSHING_KEY = "course:views:flushing"
+    FLUSH_TOKEN_KEY = "course:views:flush_token"
+    # 多进程部署时保证同一时刻只有一个进程在 flush
+    LOCK_KEY = "course:views:flush_lock"
+    LOCK_TTL = 60
+    FLUSH_INTERVAL = 10  # 秒
+    # 幂等标记保留多久 (只需覆盖 "提交后、清理 Redis 前挂掉" 到下次 flush 之间)
+    TOKEN_RETENTION_HOURS = 24
+
+    # 没有正在落库的批次时把 PENDING 原子地改名为 FLUSHING 并生成本批 token；
+    # 上次 flush 中途失败时 FLUSHING 还在，沿用它的 token (新增量留到下一轮)
+    # KEYS: [PENDING, FLUSHING, TOKEN]  ARGV: [新 token]
+    _BEGIN_FLUSH_LUA = """
+    if redis.call('EXISTS', KEYS[2]) == 0 then
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return false
+        end
+        redis.call('RENAME', KEYS[1], KEYS[2])
+        redis.call('SET', KEYS[3], ARGV[1])
+        return ARGV[1]
+    end
+    local token = redis.call('GET', KEYS[3])
+    if not token then
+        token = ARGV[1]
+        redis.call('SET', KEYS[3], token)
+    end
+    return token
+    """
+
+    @classmethod
+    async def incr(cls, course_id: int) -> int:
+        """
+        记录一次浏览
+        :return: 该课程尚未落库的浏览增量 (含本次，以及正在落库的那一批)
+        """
+        async with RedisClient.get().pipeline(transaction=True) as pipe:
+            pipe.hincrby(cls.PENDING_KEY, str(course_id), 1)
+            pipe.hget(cls.FLUSHING_KEY, str(course_id))
+            pending, flushing = await pipe.execute()
+        return int(pending) + int(flushing or 0)
+
+    @classmethod
+    async def flush(cls) -> int:
+        """
+        把累积的增量写回数据库
+        :return: 本次更新的课程数
+        """
+        client = RedisClient.get()
+        if not await client.set(cls.LOCK_KEY, "1", nx=True, ex=cls.LOCK_TTL):
+            return 0
+
+        try:
+            # RENAME 是原子的: 之后的 HINCRBY 会写进新的 PENDING_KEY，不会丢
+            script = client.register_script(cls._BEGIN_FLUSH_LUA)
+            token = await script(
+                keys=[cls.PENDING_KEY, cls.FLUSHING_KEY, cls.FLUSH_TOKEN_KEY], args=[uuid.uuid4().hex]
+            )
+            if not token:
+                return 0
+            if isinstance(token, bytes):
+                token = token.decode()
+
+            deltas = await client.hgetall(cls.FLUSHING_KEY)
+            ids = [int(k) for k in deltas]
+            counts = [int(v) for v in deltas.values()]
+
+            rows = []
+            if ids:
+                async with in_transaction() as conn:
+                    # token 已存在: 这批增量之前已经提交过 (清理 Redis 前进程挂了)，不再重复累加
+                    applied = await conn.execute_query_dict(
+                        """
+                        INSERT INTO course_view_flushes (token, created_at) VALUES ($1, now())
+                        ON CONFLICT (token) DO NOTHING
+                        RETURNING token;
+                        """,
+                        [token]
+                    )
+                    if applied:
+                        # 原生 SQL 批量更新: 一条语句搞定，且不触发 ORM 信号
+                        rows = await conn.execute_query_dict(
+                            """
+                            UPDATE courses AS c
+                            SET view_count = c.view_count + v.delta
+                            FROM unnest($1::int[], $2::int[]) AS v(id, delta)
+                            WHERE c.id = v.id
+                            RETURNING c.id, c.view_count, c.title, c.is_published;
+                            """,
+                            [ids, counts]
+                        )
+                        await conn.execute_query(
+                            f"DELETE FROM course_view_flushes "
+                            f"WHERE created_at < now() - interval '{int(cls.TOKEN_RETENTION_HOURS)} hours';"
+                        )
+                    else:
+                        logger.warning(f"⚠️ [Views] 批次 {token} 已落库过，跳过")
+
+            await client.delete(cls.FLUSHING_KEY, cls.FLUSH_TOKEN_KEY)
+
+            # 不 bump 课程列表 / 详情的 ETag 版本号: 每 10 秒一次会让 ETag 形同虚设，
+            # 浏览量只是展示用的近似值，随课程下次变更 (或 sort=hot 的分钟级 ETag) 一起刷新
+
+            # ES 里的浏览量快照一并刷新 (写的是累计值，失败了下次落库会带上最新值，不用重试)
+            if rows:
+                try:
+                    await CourseESService.update_view_counts(rows)
+                except Exception as e:
+                    logger.warning(f"⚠️ [Views] 浏览量同步到 ES 失败: {e}")
+            return len(rows)
+        finally:
+            await client.delete(cls.LOCK_KEY)
+
+    @classmethod
+    async def run_flusher(cls):
+        """后台循环 (在 lifespan 里启动)"""
+        while True:
+            await asyncio.sleep(cls.FLUSH_INTERVAL)
+            try:
+                count = await cls.flush()
+                if count:
+                    logger.info(f"👀 [Views] 已落库 {count} 门课程的浏览量")
+            except Exception as e:
+                logger.error(f"❌ [Views] 浏览量落库失败: {e}")
@@ -1,28 +1,148 @@
 # app/signals.py
+import logging
 from tortoise.signals import post_save, post_delete
-from app.models.course import Course
-from app.core.mq import RabbitMQClient
+from app.models.course import Course, Chapter, Lesson, VideoResource
+from app.models.oj import Problem
+from app.models.user import User
+from app.services.outline_cache import CourseOutlineService
+from app.services.course_neighbors import CourseNeighborService
+from app.services.es_sync import CourseESService
+from app.services.vector_db import VectorDBService
+from app.services.cache_version import CacheVersion
+from app.services.outbox_relay import OutboxRelay
+from app.utils.etag import CATALOG_VERSION, course_version, problem_version
+
+logger = logging.getLogger(__name__)
+
+
+async def _bump_course_version(course_id: int):
+    """课程详情/课程列表的 ETag 版本号 (Redis 挂了不影响保存)"""
+    try:
+        await CacheVersion.bump(course_version(course_id), CATALOG_VERSION)
+    except Exception as e:
+        logger.warning(f"⚠️ [Signals] 更新课程版本号失败: {e}")
+
+
+# 详情页相似课程卡片用到的字段 (见 CourseNeighborService.get_related；浏览量变化不在此列)
+_NEIGHBOR_CARD_FIELDS = {"title", "desc", "cover", "price", "is_published"}
+
+
+async def _bump_referrer_neighbors(course_id: int):
+    try:
+        referrers = await CourseNeighborService.referrers(course_id)
+        if referrers:
+            await CacheVersion.bump(*(CourseNeighborService.version_name(cid) for cid in referrers))
+    except Exception as e:
+        logger.warning(f"⚠️ [Signals] 更新相似推荐版本号失败: {e}")
+
 
 # 监听保存/更新 -> 发送 update 消息
 @post_save(Course)
 async def on_course_save(sender, instance, created, using_db, update_fields):
-    # 修复点：必须指定 routing_key="task.course.sync"
-    # 这样 main.py 里的消费者才能收到消息
-    await RabbitMQClient.publish(
-        routing_key="task.course.sync",
-        message={
-            "id": instance.id,
-            "action": "update"
-        }
-    )
+    # 变更检测: 快照对比 (传了 update_fields 时只看这些字段)
+    changed = instance.changed_fields()
+    if update_fields and not created:
+        changed &= set(update_fields)
+    if not changed:
+        return
+
+    await _bump_course_version(instance.id)
+    # 相似课程卡片展示的字段变了: 把它列为相似课程的课程详情 ETag 也要失效
+    if not created and changed & _NEIGHBOR_CARD_FIELDS:
+        await _bump_referrer_neighbors(instance.id)
+
+    # 只有 ES 索引 / 课程向量依赖的字段变了才需要同步 (只改 view_count / updated_at 等字段不发消息)
+    synced = changed & (set(CourseESService.INDEXED_FIELDS) | VectorDBService.EMBEDDING_SOURCE_FIELDS)
+    if not created and not synced:
+        return
+
+    message = {"id": instance.id, "action": "update"}
+    if not created:
+        # 消费者据此做局部更新 / 判断是否要重新生成向量；新建的课程不带 fields，整篇写入
+        message["fields"] = sorted(synced)
+
+    # 写入发件箱 (和课程写入在同一个事务里)，由 OutboxRelay 投递到 "task.course.sync"
+    await OutboxRelay.enqueue("task.course.sync", message, using_db=using_db)
 
 # 监听删除 -> 发送 delete 消息
 @post_delete(Course)
 async def on_course_delete(sender, instance, using_db):
-    await RabbitMQClient.publish(
-        routing_key="task.course.sync",
-        message={
-            "id": instance.id,
-            "action": "delete"
-        }
-    )
\ No newline at end of file
+    await _bump_course_version(instance.id)
+    await OutboxRelay.enqueue(
+        "task.course.sync",
+        {"id": instance.id, "action": "delete"},
+        using_db=using_db
+    )
+
+
+# 讲师改了显示名 -> 课程卡片 / 详情里的讲师名变了，ES 文档里的 teacher_name 也要改
+@post_save(User)
+async def on_user_save(sender, instance, created, using_db, update_fields):
+    if created or not instance.display_name_changed():
+        return
+    if update_fields and not {"nickname", "username"} & set(update_fields):
+        return
+
+    course_ids = await Course.filter(teacher_id=instance.id).values_list("id", flat=True)
+    if not course_ids:
+        return
+
+    try:
+        await CacheVersion.bump(CATALOG_VERSION, *(course_version(cid) for cid in course_ids))
+    except Exception as e:
+        logger.warning(f"⚠️ [Signals] 更新课程版本号失败: {e}")
+
+    # 消费者收到后从数据库读最新的显示名，按 teacher_id 批量改写 ES 文档
+    await OutboxRelay.enqueue(
+        "task.course.sync",
+        {"teacher_id": instance.id, "action": "teacher"},
+        using_db=using_db
+    )
+
+
+# === 课程大纲缓存失效 ===
+# 章节/课时的增删改，以及被课时挂载的视频/题目被修改，都会让所属课程的大纲缓存失效
+
+@post_save(Chapter)
+async def on_chapter_save(sender, instance, created, using_db, update_fields):
+    await CourseOutlineService.invalidate(instance.course_id)
+
+
+@post_delete(Chapter)
+async def on_chapter_delete(sender, instance, using_db):
+    await CourseOutlineService.invalidate(instance.course_id)
+
+
+async def _invalidate_lesson_outline(lesson: Lesson):
+    course_ids = await Chapter.filter(id=lesson.chapter_id).values_list("course_id", flat=True)
+    await CourseOutlineService.invalidate(*course_ids)
+
+
+@post_save(Lesson)
+async def on_lesson_save(sender, instance, created, using_db, update_fields):
+    await _invalidate_lesson_outline(instance)
+
+
+@post_delete(Lesson)
+async def on_lesson_delete(sender, instance, using_db):
+    await _invalidate_lesson_outline(instance)
+
+
+@post_save(VideoResource)
+async def on_video_save(sender, instance, created, using_db, update_fields):
+    if created:
+        return
+    course_ids = await Lesson.filter(video_id=instance.id).values_list("chapter__course_id", flat=True)
+    await CourseOutlineService.invalidate(*course_ids)
+
+
+@post_save(Problem)
+async def on_problem_save(sender, instance, created, using_db, update_fields):
+    try:
+        await CacheVersion.bump(problem_version(instance.id))
+    except Exception as e:
+        logger.warning(f"⚠️ [Signals] 更新题目版本号失败: {e}")
+    if created:
+        return
+    course_ids = await Lesson.filter(problem_id=instance.id).values_list("chapter__course_id", flat=True)
+    await CourseOutlineService.invalidate(*course_ids)
@@ -0,0 +1,47 @@
+# app/utils/etag.py
+import hashlib
+from fastapi import Request, Response
+
+# === 参与 ETag 计算的版本号名称 (CacheVersion) ===
+# 任意课程增删改 -> 课程列表 (浏览量落库不算，见 ViewCounterService.flush)
+CATALOG_VERSION = "course_catalog"
+
+
+def course_version(course_id: int) -> str:
+    return f"course:{course_id}"
+
+
+def problem_version(problem_id: int) -> str:
+    return f"problem:{problem_id}"
+
+
+def enrollment_version(user_id: int) -> str:
+    """用户选课变化 (影响 is_joined)"""
+    return f"enroll:{user_id}"
+
+
+def make_etag(*parts) -> str:
+    """由实体版本号等组成强 ETag"""
+    raw = ":".join(str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match 命中 (按 RFC 7232 使用弱比较，忽略 W/ 前缀)"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def set_etag(response: Response, etag: str):
+    """正常响应也带上 ETag；no-cache 表示客户端每次都要带 If-None-Match 来验证"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
@@ -0,0 +1,37 @@
+# app/utils/fast_json.py
+from typing import Any, Iterable, List, Optional, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """
+    列表序列化器 (模块级创建一次，重复使用)
+    TypeAdapter(List[Model]) 的校验和 JSON 序列化都在 pydantic-core (Rust) 里一次完成
+    """
+    return TypeAdapter(List[model])
+
+
+def dump_list(adapter: TypeAdapter, rows: Iterable[Any]) -> orjson.Fragment:
+    """
+    ORM 对象 / values() 字典 -> JSON 字节
+    不经过 model_dump() 中间字典和 FastAPI 的 jsonable_encoder
+    返回 orjson.Fragment，可以直接嵌进 json_response 的响应体里
+    """
+    items = adapter.validate_python(list(rows), from_attributes=True)
+    return orjson.Fragment(adapter.dump_json(items))
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    直接用 orjson 编码并返回 Response (跳过 FastAPI 的返回值校验和二次编码)
+    注意: 直接返回 Response 时，依赖注入的 response 上设置的 header 不会生效，需要通过 headers 传入
+    """
+    return Response(
+        content=orjson.dumps(content),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers
+    )
@@ -39,41 +39,39 @@ async def get_recent_contacts(user: User = Depends(get_current_user)):
     contacts_data = []
 
     if contact_user_ids:
-        contacts = await User.filter(id__in=contact_user_ids).all()
+        # 只取联系人卡片用到的列 (不加载密码哈希、推送订阅等整行数据)
+        contacts = await User.filter(id__in=contact_user_ids).values("id", "nickname", "avatar", "role")
 
         for contact in contacts:
             # 3. 查最后一条私信
             last_message = await PrivateMessage.filter(
-                Q(sender_id=user.id, receiver_id=contact.id) |
-                Q(sender_id=contact.id, receiver_id=user.id)
-            ).order_by('-created_at').first()
+                Q(sender_id=user.id, receiver_id=contact["id"]) |
+                Q(sender_id=contact["id"], receiver_id=user.id)
+            ).order_by('-created_at').first().values("content", "created_at")
 
             # 4. 查未读数
             unread_count = await PrivateMessage.filter(
-                sender_id=contact.id,
+                sender_id=contact["id"],
                 receiver_id=user.id,
                 is_read=False
             ).count()
 
             contacts_data.append({
-                "id": contact.id,
-                "nickname": contact.nickname,
-                "avatar": contact.avatar,
-                "role": contact.role,
-                "last_msg": last_message.content if last_message else None,
-                "last_time": last_message.created_at.strftime("%H:%M") if last_message else None,
+                **contact,
+                "last_msg": last_message["content"] if last_message else None,
+                "last_time": last_message["created_at"].strftime("%H:%M") if last_message else None,
                 "unread_count": unread_count
             })
 
     # 冷启动推荐
     if not contacts_data and user.role == 0:
-        teachers = await User.filter(role=1).limit(5)
+        teachers = await User.filter(role=1).limit(5).values("id", "nickname", "avatar", "role")
         for t in teachers:
             contacts_data.append({
-                "id": t.id,
-                "nickname": f"{t.nickname} (推荐)",
-                "avatar": t.avatar,
-                "role": t.role,
+                "id": t["id"],
+                "nickname": f"{t['nickname']} (推荐)",
+                "avatar": t["avatar"],
+                "role": t["role"],
                 "last_msg": "你好，我是老师，有问题可以问我",
                 "last_time": "",
                 "unread_count": 0
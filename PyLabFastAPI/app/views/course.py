@@ -1,24 +1,46 @@
 # PyLabFastAPI/app/views/course.py
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
 from typing import Optional
 from typing import List
 from app.models.user import User
 from app.models.course import Course, Chapter, Lesson, VideoResource, UserCourse
-from tortoise.expressions import F
+import asyncio
+import time
+from datetime import datetime
+from tortoise.expressions import F, Q
+from tortoise.transactions import in_transaction
 from app.schemas.course import (
-    CourseCreateReq, CourseOut, UserCourseOut,
+    CourseCreateReq, CourseOut, CourseCardOut, CourseSearchFilter, UserCourseOut,
     ChapterCreateReq, ChapterOut,
     LessonCreateReq, LessonOut,CourseUpdateReq,ChapterUpdateReq,LessonUpdateReq
 )
+from app.config import settings
 from app.services.es_sync import CourseESService
 from app.services.vector_db import VectorDBService
-from collections import defaultdict
-from app.deps import get_current_user
-from app.utils.jwt import MyJWT
+from app.services.course_search import HybridSearchService
+from app.services.course_suggest import CourseSuggestService
+from app.services.course_stats import CourseStatsService
+from app.services.view_counter import ViewCounterService
+from app.services.hot_ranking import HotRankingService
+from app.services.course_neighbors import CourseNeighborService
+from app.services.outline_cache import CourseOutlineService
+from app.services.enrollment import EnrollmentService
+from app.services.cache_version import CacheVersion
+from app.utils.etag import (
+    CATALOG_VERSION, course_version, enrollment_version,
+    make_etag, is_not_modified, not_modified, set_etag
+)
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.utils.fast_json import list_adapter, dump_list, json_response
+from app.deps import get_current_user, get_optional_user_id
 from app.services.vector_db import VectorDBService
 
 router = APIRouter(prefix="/courses", tags=["Course"])
 
+# 列表序列化器 (模块加载时构建一次)
+_COURSE_LIST = list_adapter(CourseOut)
+_COURSE_CARD_LIST = list_adapter(CourseCardOut)
+
 
 # === 1. 创建课程 ===
 @router.post("")
@@ -27,11 +49,13 @@ async def create_course(
         bg_tasks: BackgroundTasks,
         user: User = Depends(get_current_user)
 ):
-    # 讲师创建一个新课程
-    course = await Course.create(
-        teacher=user,
-        **req.model_dump()
-    )
+    # 讲师创建一个新课程 (和 ES 同步事件在同一个事务里提交)
+    async with CacheVersion.deferred(), in_transaction() as conn:
+        course = await Course.create(
+            teacher=user,
+            **req.model_dump(),
+            using_db=conn
+        )
 
     # 异步生成向量
     bg_tasks.add_task(
@@ -56,14 +80,12 @@ async def create_course(
 async def get_my_courses(user: User = Depends(get_current_user)):
     courses = await Course.filter(teacher=user).all()
 
-    # [核心修复] 列表推导式中使用 model_validate
-    data = [CourseOut.model_validate(c) for c in courses]
-
-    return {
+    # [性能] ORM 对象一次性校验并序列化成 JSON 字节，不再逐条 model_validate
+    return json_response({
         "code": 200,
         "msg": "获取成功",
-        "data": data
-    }
+        "data": dump_list(_COURSE_LIST, courses)
+    })
 
 
 # === 3. 给课程添加章节 ===
@@ -98,47 +120,25 @@ async def create_chapter(
 
 # === 4. 获取某课程的所有章节(含课时) ===
 @router.get("/{course_id}/chapters")
-async def get_course_chapters(course_id: int):
-    # [核心修复]
-    # 1. 增加 lessons__video (连表查询视频信息)
-    # 2. 增加 lessons__problem (连表查询题目信息)
-    chapters = await Chapter.filter(course_id=course_id) \
-        .prefetch_related('lessons', 'lessons__video', 'lessons__problem') \
-        .order_by("rank") \
-        .all()
-
-    data = []
-    for c in chapters:
-        # 手动排序 lesson (因为 Tortoise 的 prefetch 排序有时不稳定)
-        sorted_lessons = sorted(c.lessons, key=lambda x: x.rank)
-
-        # 构造 Pydantic 模型 (需确保 schemas/course.py 里的 LessonOut 有 video/problem 字段)
-        # 这里用简易字典构造法，确保字段存在
-        c_data = {
-            "id": c.id,
-            "title": c.title,
-            "rank": c.rank,
-            "lessons": []
-        }
-
-        for l in sorted_lessons:
-            l_data = {
-                "id": l.id,
-                "title": l.title,
-                "type": l.type,
-                "rank": l.rank,
-                "video": l.video,  # 关键：只要上面 prefetch 了，这里就有值
-                "problem": l.problem  # 关键：OJ 题目也有了
-            }
-            c_data["lessons"].append(l_data)
+async def get_course_chapters(course_id: int, request: Request):
+    # [性能] 大纲按课程版本缓存成序列化好的 JSON (见 CourseOutlineService)
+    # 版本号没变 (If-None-Match 命中) 直接 304；否则命中缓存时直接拼进响应体，不查库、不做 ORM/Pydantic 转换
+    version = None
+    try:
+        version = await CourseOutlineService.get_version(course_id)
+    except Exception:
+        pass
 
-        data.append(c_data)
+    etag = make_etag("course_outline", course_id, version) if version else None
+    if etag and is_not_modified(request, etag):
+        return not_modified(etag)
 
-    return {
-        "code": 200,
-        "msg": "获取成功",
-        "data": data
-    }
+    outline = await CourseOutlineService.get_json(course_id, version)
+    body = '{"code":200,"msg":"获取成功","data":' + outline + '}'
+    response = Response(content=body, media_type="application/json")
+    if etag:
+        set_etag(response, etag)
+    return response
 
 
 # === 5. 创建课时 (核心：绑定视频) ===
@@ -201,59 +201,98 @@ async def search_courses_semantic(q: str):
     }
 
 
+# === 6.1 搜索框联想 (必须声明在 /{course_id} 之前) ===
+@router.get("/suggest", summary="课程标题联想")
+async def suggest_courses(q: str = "", size: int = 8):
+    # 只走 ES completion 前缀匹配 (+ 短前缀进程内缓存)，不做混合检索
+    # 用户提交搜索时前端再调用 GET /courses?keyword=
+    return {
+        "code": 200,
+        "msg": "获取成功",
+        "data": await CourseSuggestService.suggest(q, size)
+    }
+
+
+async def _record_view(course_id: int) -> Optional[int]:
+    """
+    记录一次浏览 (Redis 计数 + 热度榜)
+    :return: 尚未落库的浏览增量；Redis 不可用时返回 None
+    """
+    pending_views = None
+    try:
+        pending_views = await ViewCounterService.incr(course_id)
+        await HotRankingService.record(course_id, HotRankingService.VIEW_WEIGHT)
+    except Exception:
+        pass
+    return pending_views
+
+
 # ===  7. 课程详情 ===
 @router.get("/{course_id}", summary="获取课程详情")
-async def get_course_detail(course_id: int, request: Request):
-    # 1. 查询课程
-    course = await Course.get_or_none(id=course_id)
-    if not course:
-        raise HTTPException(status_code=404, detail="课程不存在")
+async def get_course_detail(
+        course_id: int,
+        request: Request,
+        response: Response,
+        bg_tasks: BackgroundTasks,
+        user_id: Optional[int] = Depends(get_optional_user_id)
+):
+    # 1. 当前用户 (可选登录) 由 get_optional_user_id 识别，用于判断是否已加入
 
-    # 2. 浏览量 +1
-    course.view_count = F("view_count") + 1
-    await course.save()
+    # 2. ETag: 课程 / 相似推荐 / 当前用户选课 的版本号，都没变就直接 304，不查整行
+    #    (相似课程卡片的内容变了会 bump 本课程的相似推荐版本号，见 signals.py)
+    etag = None
+    try:
+        versions = await CacheVersion.get(
+            course_version(course_id),
+            CourseNeighborService.version_name(course_id),
+            enrollment_version(user_id or 0),
+        )
+        etag = make_etag("course_detail", course_id, user_id or 0, *versions)
+    except Exception:
+        pass
 
-    # 3. 强制重新查询
-    course = await Course.get(id=course_id).select_related("teacher")
+    if etag and is_not_modified(request, etag):
+        # 主键存在性检查 (不存在的 ID 不计浏览量)；304 也算一次浏览
+        if not await Course.filter(id=course_id).exists():
+            raise HTTPException(status_code=404, detail="课程不存在")
+        await _record_view(course_id)
+        return not_modified(etag)
 
-    # 4. [修改逻辑] 适配 MyJWT 判断当前用户是否已加入
-    is_joined = False
-    auth_header = request.headers.get("Authorization")
+    # 3. 查询课程
+    course = await Course.get_or_none(id=course_id).select_related("teacher")
+    if not course:
+        raise HTTPException(status_code=404, detail="课程不存在")
 
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-        try:
-            # === 这里改用 MyJWT.decode_token ===
-            # 因为 MyJWT.decode_token 失败会抛出 HTTPException，所以我们需要 try-except 捕获它
-            payload = MyJWT.decode_token(token)
-
-            # 你的 MyJWT 生成 Token 时把 user_id 放在了 'sub' 字段
-            user_id = payload.get("sub")
-
-            if user_id:
-                # 还要检查 Token 是否被拉黑 (可选，虽然详情页不做严格鉴权也行，但严谨点好)
-                jti = payload.get("jti")
-                if not await MyJWT.is_token_revoked(jti):
-                    # 查库看是否已选课
-                    exists = await UserCourse.exists(user_id=int(user_id), course_id=course.id)
-                    if exists:
-                        is_joined = True
-        except Exception:
-            # 无论是 Token 过期、格式错误还是 Redis 连接失败，都视为未登录，不报错
-            pass
+    # 4. 浏览量 +1 (先记在 Redis，后台定期批量落库)
+    #    展示值 = 数据库里的值 + 尚未落库的增量
+    pending_views = await _record_view(course_id)
+    if pending_views is not None:
+        course.view_count += pending_views
+    else:
+        # Redis 不可用时退回直接写库 (QuerySet.update 不会触发 post_save)
+        await Course.filter(id=course.id).update(view_count=F("view_count") + 1)
+        course.view_count += 1
 
-    # 5. 推荐逻辑
+    # 5. 是否已选课 (读用户的选课集合，不查库)
+    is_joined = await EnrollmentService.is_joined(user_id, course.id)
+
+    # 6. 推荐逻辑: 读预计算的相似课程表 (从没算过的课程在后台补算一次，算出来为空的不再重复算)
     related_courses = []
     try:
-        related_courses = await VectorDBService.search_similar_by_id(course.id, limit=4)
+        related_courses = await CourseNeighborService.get_related(course.id, limit=4)
+        if not related_courses and await CourseNeighborService.claim_initial_compute(course.id):
+            bg_tasks.add_task(CourseNeighborService.initial_compute, course.id)
     except:
         pass
 
-    # 6. 组装数据
+    # 7. 组装数据
     data = CourseOut.model_validate(course).model_dump()
-    data["teacher_name"] = course.teacher.nickname or course.teacher.username
+    data["teacher_name"] = course.teacher.display_name
     data["is_joined"] = is_joined
 
+    if etag:
+        set_etag(response, etag)
+
     return {
         "code": 200,
         "msg": "获取成功",
@@ -264,98 +303,249 @@ async def get_course_detail(course_id: int, request: Request):
     }
 
 
+# --- 普通浏览的排序键 (游标分页用) ---
+_BROWSE_ORDERING = {
+    "new": ("-created_at", "-id"),
+    "hot": ("-view_count", "-created_at", "-id"),
+}
+
+
+def _browse_sort(sort: str) -> str:
+    return "hot" if sort == "hot" else "new"
+
+
+def _keyset_values(sort: str, row: dict) -> list:
+    """取出一条记录的排序键，编码进游标"""
+    if _browse_sort(sort) == "hot":
+        return [row["view_count"], row["created_at"].isoformat(), row["id"]]
+    return [row["created_at"].isoformat(), row["id"]]
+
+
+def _keyset_filter(sort: str, values: list) -> Q:
+    """
+    倒序排列下 "排在游标之后" 的条件，等价于 (a, b, c) < (va, vb, vc)
+    OR 条件本身没法作为索引扫描的范围边界，额外 AND 一个首列 <= 的冗余条件，
+    让 Postgres 直接从游标位置开始倒序扫索引 (否则深翻页仍要从索引头部一路过滤下来)
+    """
+    if _browse_sort(sort) == "hot":
+        view_count, created_at, course_id = int(values[0]), datetime.fromisoformat(values[1]), int(values[2])
+        return Q(view_count__lte=view_count) & (
+            Q(view_count__lt=view_count)
+            | Q(view_count=view_count, created_at__lt=created_at)
+            | Q(view_count=view_count, created_at=created_at, id__lt=course_id)
+        )
+
+    created_at, course_id = datetime.fromisoformat(values[0]), int(values[1])
+    return Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=course_id))
+
+
+def _filter_q(filters: CourseSearchFilter) -> Q:
+    """普通浏览的筛选条件 (和混合检索下推到 ES / pgvector 的条件一致)"""
+    q = Q(is_published=True)
+    if filters.price_min is not None:
+        q &= Q(price__gte=filters.price_min)
+    if filters.price_max is not None:
+        q &= Q(price__lte=filters.price_max)
+    if filters.is_free is True:
+        q &= Q(price=0)
+    elif filters.is_free is False:
+        q &= Q(price__gt=0)
+    if filters.teacher_id is not None:
+        q &= Q(teacher_id=filters.teacher_id)
+    if filters.created_from:
+        q &= Q(created_at__gte=filters.created_from)
+    if filters.created_to:
+        q &= Q(created_at__lte=filters.created_to)
+    return q
+
+
+# 热度榜游标 = 前缀 + 榜单偏移量 (和数据库游标区分开)
+_HOT_CURSOR_PREFIX = "hot:"
+
+
+async def _get_hot_page(offset: int, size: int, bg_tasks: BackgroundTasks):
+    """
+    从 Redis 热度榜取一页
+    :return: (课程卡片行, 下一页游标)；榜单不存在时返回 None 并在后台重建
+    """
+    ids = await HotRankingService.top(offset, size + 1)
+    if ids is None:
+        bg_tasks.add_task(HotRankingService.rebuild)
+        return None
+
+    page_ids = ids[:size]
+    next_cursor = f"{_HOT_CURSOR_PREFIX}{offset + size}" if len(ids) > size else None
+
+    # 回表 (保持榜单顺序)
+    rows = await Course.filter(id__in=page_ids, is_published=True).values(*CourseCardOut.CARD_FIELDS)
+    course_map = {r["id"]: r for r in rows}
+    return [course_map[cid] for cid in page_ids if cid in course_map], next_cursor
+
+
 # === 8. 课程列表 (混合检索 RRF 版) ===
 @router.get("", summary="获取公开课程列表(混合检索)")
 async def get_courses(
+        request: Request,
+        bg_tasks: BackgroundTasks,
         page: int = 1,
         size: int = 12,
         keyword: str = None,
-        sort: str = "new"
+        sort: str = "new",
+        cursor: Optional[str] = None,
+        filters: CourseSearchFilter = Depends(),
+        user_id: Optional[int] = Depends(get_optional_user_id)
 ):
+    """
+    - keyword 不为空: 混合检索，page 分页；筛选条件下推到两路召回，并返回分面计数 facets
+    - keyword 为空: 普通浏览，支持 page 分页，或传上一页返回的 next_cursor 走游标分页
+      sort=hot 时优先读 Redis 热度榜 (带时间衰减)，榜单不可用再回退数据库按浏览量排序
+    - 筛选: price_min / price_max / is_free / teacher_id / created_from / created_to
+    """
+    next_cursor = None
+    facets = None
+    filtered = not filters.is_empty()
+
+    # 普通浏览支持 ETag: 课程目录 / 当前用户选课 的版本号没变就直接 304
+    # (热度榜随浏览实时变化，按分钟粒度刷新)
+    etag = None
+    if not keyword:
+        try:
+            versions = await CacheVersion.get(CATALOG_VERSION, enrollment_version(user_id or 0))
+            bucket = int(time.time() // 60) if _browse_sort(sort) == "hot" else 0
+            etag = make_etag(
+                "course_list", *versions, user_id or 0, bucket, page, size, _browse_sort(sort), cursor or "",
+                filters.cache_key()
+            )
+            if is_not_modified(request, etag):
+                return not_modified(etag)
+        except Exception:
+            pass
+
     # --- 分支 A: 混合检索 (有关键词时触发) ---
     if keyword:
-        # 1. 定义 RRF 常数 k (平滑参数，一般取 60)
-        RRF_K = 60
-        # 结果容器：{course_id: score}
-        fused_scores = defaultdict(float)
-
-        # 2. 并行召回 (ES + Vector)
-        # 2.1 获取 关键词检索 结果 (ES 负责精确匹配)
-        # 注意: es_sync.py 的 search 方法最好也支持 limit，目前默认返回所有，暂时取前 50
-        es_hits = await CourseESService.search(keyword)
-        es_hits = es_hits[:50]
-
-        # 2.2 获取 向量检索 结果 (AI 负责语义匹配)
-        vector_hits = await VectorDBService.search_similar_courses(keyword, limit=50)
-
-        # 3. 计算 RRF 分数
-        # 公式: Score = 1 / (k + rank)
-
-        # 处理 ES 排名 (rank 从 0 开始)
-        for rank, item in enumerate(es_hits):
-            doc_id = item['id']
-            fused_scores[doc_id] += 1 / (RRF_K + rank + 1)
-
-        # 处理 Vector 排名
-        for rank, item in enumerate(vector_hits):
-            doc_id = item['id']
-            fused_scores[doc_id] += 1 / (RRF_K + rank + 1)
-
-        # 4. 根据融合分数倒序排序
-        # sorted 返回 [(id, score), (id, score)...]
-        sorted_results = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
+        # 1~4. ES + Vector 并发召回 (各自带超时)，RRF 融合排序
+        # 任意一路超时/出错时只用另一路的结果，并标记 degraded
+        # 筛选条件在两路召回内部生效 (ES bool.filter / pgvector WHERE)，不在融合后过滤
+        ranking = await HybridSearchService.search(keyword, filters)
+        sorted_ids = ranking["ids"]
+        degraded = ranking["degraded"]
+        facets = ranking["facets"]
 
         # 5. 内存分页
         start = (page - 1) * size
         end = start + size
 
         # 拿到本页的目标 ID 列表
-        target_ids = [cid for cid, score in sorted_results[start:end]]
-        total = len(sorted_results)
+        target_ids = sorted_ids[start:end]
+        total = len(sorted_ids)
 
         if not target_ids:
             return {
                 "code": 200,
                 "msg": "获取成功",
-                "data": {"items": [], "total": 0, "page": page, "size": size}
+                "data": {
+                    "items": [], "total": total, "page": page, "size": size, "next_cursor": None,
+                    "degraded": bool(degraded), "degraded_sources": degraded, "facets": facets
+                }
             }
 
-        # 6. 回表查询完整详情 (必须保持 RRF 算出来的顺序)
-        # 先一次性查出来
-        db_courses = await Course.filter(id__in=target_ids).select_related('teacher').all()
-        # 以此建立字典映射
-        course_map = {c.id: c for c in db_courses}
+        # 6. 取卡片数据 (必须保持 RRF 算出来的顺序)
+        # 开启 COURSE_LIST_FROM_ES 时优先一次 mget 从 ES _source 取，不碰 Postgres
+        course_map = {}
+        if settings.COURSE_LIST_FROM_ES:
+            try:
+                course_map = await asyncio.wait_for(
+                    CourseESService.get_cards(target_ids), timeout=settings.SEARCH_ES_TIMEOUT
+                )
+            except Exception as e:
+                print(f"⚠️ [ES] 读取课程卡片失败，回退数据库: {e}")
+
+        # ES 里没取到的再回表 (只取卡片用到的列，讲师只 JOIN 出昵称/用户名)
+        missing_ids = [cid for cid in target_ids if cid not in course_map]
+        if missing_ids:
+            rows = await Course.filter(id__in=missing_ids).values(*CourseCardOut.CARD_FIELDS)
+            # 以此建立字典映射
+            course_map.update({r["id"]: r for r in rows})
         # 按 target_ids 的顺序重组列表 (关键步骤，否则顺序会乱)
         paged_courses = [course_map[cid] for cid in target_ids if cid in course_map]
 
-    # --- 分支 B: 普通浏览 (无关键词，走数据库) ---
+    # --- 分支 B: 普通浏览 (无关键词) ---
     else:
-        query = Course.filter(is_published=True)
-        if sort == "hot":
-            query = query.order_by("-view_count", "-created_at")
+        degraded = []
+        hot_page = None
+
+        # B1. 最热: 优先直接读 Redis 热度榜 (游标里记的是榜单偏移量；榜单不支持筛选)
+        hot_offset = (page - 1) * size
+        if cursor and cursor.startswith(_HOT_CURSOR_PREFIX):
+            try:
+                hot_offset = int(cursor[len(_HOT_CURSOR_PREFIX):])
+            except ValueError:
+                raise HTTPException(status_code=400, detail="无效的分页游标")
+
+        if _browse_sort(sort) == "hot" and not filtered and (not cursor or cursor.startswith(_HOT_CURSOR_PREFIX)):
+            try:
+                hot_page = await _get_hot_page(hot_offset, size, bg_tasks)
+            except Exception as e:
+                print(f"⚠️ [Hot] 读取热度榜失败，回退数据库排序: {e}")
+
+        if hot_page is not None:
+            paged_courses, next_cursor = hot_page
+
+        # B2. 走数据库
         else:
-            query = query.order_by("-created_at")
-
-        total = await query.count()
-        paged_courses = await query.offset((page - 1) * size).limit(size).select_related('teacher')
+            query = Course.filter(_filter_q(filters)).order_by(*_BROWSE_ORDERING[_browse_sort(sort)])
+
+            if cursor and cursor.startswith(_HOT_CURSOR_PREFIX):
+                # 热度榜中途不可用: 榜单游标按偏移量降级
+                query = query.offset(hot_offset)
+            elif cursor:
+                # 游标模式 (无限滚动): WHERE (排序键) < (上一页最后一条)，不再 OFFSET
+                try:
+                    query = query.filter(_keyset_filter(sort, decode_cursor(cursor)))
+                except (ValueError, TypeError, IndexError):
+                    raise HTTPException(status_code=400, detail="无效的分页游标")
+            else:
+                query = query.offset((page - 1) * size)
+
+            # 多取一条用来判断是否还有下一页
+            rows = await query.limit(size + 1).values(*CourseCardOut.CARD_FIELDS)
+            paged_courses = rows[:size]
+            if len(rows) > size:
+                next_cursor = encode_cursor(_keyset_values(sort, paged_courses[-1]))
+
+        # 总数用定期刷新的近似值，不再每次 COUNT(*) (带筛选时只能现算)
+        if filtered:
+            total = await Course.filter(_filter_q(filters)).count()
+        else:
+            total = await CourseStatsService.published_count()
 
     # --- 通用序列化 ---
-    data = []
-    for c in paged_courses:
-        c_dto = CourseOut.model_validate(c).model_dump()
-        c_dto['teacher_name'] = c.teacher.nickname or c.teacher.username
-        data.append(c_dto)
+    # 已登录时一次 SMISMEMBER 标记本页哪些课程已加入
+    joined = await EnrollmentService.joined_map(user_id, [r["id"] for r in paged_courses])
+    for r in paged_courses:
+        r["is_joined"] = joined[r["id"]]
 
-    return {
+    # [性能] 整页卡片一次序列化成 JSON 字节，orjson 直接拼进响应体
+    resp = json_response({
         "code": 200,
         "msg": "获取成功",
         "data": {
-            "items": data,
+            "items": dump_list(_COURSE_CARD_LIST, paged_courses),
             "total": total,
             "page": page,
-            "size": size
+            "size": size,
+            # 普通浏览的下一页游标 (没有下一页时为 None)
+            "next_cursor": next_cursor,
+            # 混合检索时某一路召回超时/失败，结果只来自另一路
+            "degraded": bool(degraded),
+            "degraded_sources": degraded,
+            # 分面计数 (混合检索时由 ES 聚合返回；普通浏览 / ES 降级时为 None)
+            "facets": facets
         }
-    }
+    })
+    if etag:
+        set_etag(resp, etag)
+    return resp
 
 
 # === 9. 加入课程  ===
@@ -383,6 +573,18 @@ async def join_course(course_id: int, user: User = Depends(get_current_user)):
 
     # 3. 创建学籍
     enrollment = await UserCourse.create(user=user, course=course)
+    await EnrollmentService.add(user.id, course.id)
+    try:
+        # is_joined 变了，该用户看到的课程详情 / 列表 ETag 要更新
+        await CacheVersion.bump(enrollment_version(user.id))
+    except Exception as e:
+        print(f"⚠️ [ETag] 更新选课版本号失败: {e}")
+
+    # 4. 热度 +加入学习权重 (失败不影响加入)
+    try:
+        await HotRankingService.record(course.id, HotRankingService.ENROLL_WEIGHT)
+    except Exception as e:
+        print(f"⚠️ [Hot] 记录热度失败: {e}")
 
     return {
         "code": 200,
@@ -393,7 +595,12 @@ async def join_course(course_id: int, user: User = Depends(get_current_user)):
 
 # === [新增] 8. 更新课程 (修复 405 错误) ===
 @router.patch("/{course_id}", summary="更新课程信息/发布状态")
-async def update_course(course_id: int, req: CourseUpdateReq, user: User = Depends(get_current_user)):
+async def update_course(
+        course_id: int,
+        req: CourseUpdateReq,
+        bg_tasks: BackgroundTasks,
+        user: User = Depends(get_current_user)
+):
     course = await Course.get_or_none(id=course_id, teacher=user)
     if not course:
         raise HTTPException(404, "课程不存在或无权操作")
@@ -404,17 +611,23 @@ async def update_course(course_id: int, req: CourseUpdateReq, user: User = Depen
         return {"code": 400, "msg": "没有提交任何修改", "data": None}
 
     await course.update_from_dict(update_data)
-    await course.save()
+    async with CacheVersion.deferred(), in_transaction() as conn:
+        await course.save(using_db=conn)
 
-    # 如果修改了发布状态，触发 ES 同步
+    # 如果修改了发布状态: ES 同步由 signals.py 的 post_save 触发，
+    # 这里只需让搜索排序缓存失效 (新发布的课程要能被搜到，下架的要消失)
     if "is_published" in update_data:
-        # 这里的 rabbit_client 需要确认你是否有这个 import，如果没有可以暂时注释掉或者手动调用
-        # from app.core.mq import rabbit_client
-        # await rabbit_client.publish_message({"id": course.id, "action": "update"})
-
-        # 暂时用简单的 ES 同步代替 (如果你的 es_sync.py 有 sync 方法)
-        # 或者直接忽略，等后台 worker 扫表
-        pass
+        await HybridSearchService.invalidate()
+        # 热度榜只收录已发布课程
+        try:
+            if course.is_published:
+                await HotRankingService.add_course(course)
+            else:
+                await HotRankingService.remove_course(course.id)
+        except Exception as e:
+            print(f"⚠️ [Hot] 更新热度榜失败: {e}")
+        # 发布状态影响它能否出现在别的课程的相似推荐里
+        bg_tasks.add_task(CourseNeighborService.refresh_affected, course.id)
 
     return {
         "code": 200,
@@ -514,18 +727,26 @@ async def delete_lesson(lesson_id: int, user: User = Depends(get_current_user)):
 
 # === [新增] 13. 删除整个课程 ===
 @router.delete("/{course_id}")
-async def delete_course(course_id: int, user: User = Depends(get_current_user)):
+async def delete_course(course_id: int, bg_tasks: BackgroundTasks, user: User = Depends(get_current_user)):
     course = await Course.get_or_none(id=course_id, teacher=user)
     if not course:
         raise HTTPException(status_code=404, detail="课程不存在或无权操作")
 
+    # 先记下把它列为相似课程的课程，删除后 (相似表行级联删除) 重算它们
+    referrers = await CourseNeighborService.referrers(course_id)
+
     # 级联删除：章节、课时、关联的 UserCourse 都会被删除 (取决于数据库级联设置)
     # Tortoise ORM 默认通常需要手动处理，或者数据库层面有 ON DELETE CASCADE
     # 这里简单直接删，如果报错说明有外键约束没解开
-    await course.delete()
+    # ES 删除由 signals.py 的 post_delete 写入发件箱，和删除在同一个事务里提交
+    async with CacheVersion.deferred(), in_transaction() as conn:
+        await course.delete(using_db=conn)
 
-    # 记得同步删除 ES 索引
-    from app.services.es_sync import CourseESService
-    await CourseESService.delete(course_id)
+    await HybridSearchService.invalidate()
+    bg_tasks.add_task(CourseNeighborService.recompute_many, referrers)
+    try:
+        await HotRankingService.remove_course(course_id)
+    except Exception as e:
+        print(f"⚠️ [Hot] 更新热度榜失败: {e}")
 
     return {"code": 200, "msg": "课程已删除", "data": None}
\ No newline at end of file
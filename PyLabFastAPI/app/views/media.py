@@ -75,9 +75,10 @@ async def upload_file(
 
 @router.get("/videos", summary="获取我的视频列表")
 async def get_my_videos(user: User = Depends(get_current_user)):
-    videos = await VideoResource.filter(uploader=user).order_by("-created_at").all()
-    # 这里直接返回 ORM 对象列表可能需要 model_validate，或者让 FastAPI 自动处理
-    # 为了保险，可以手动转一下
+    # 只取列表展示用到的列，直接返回字典 (不构造 ORM 对象)
+    videos = await VideoResource.filter(uploader_id=user.id).order_by("-created_at").values(
+        "id", "title", "file_key", "play_url", "duration", "status", "uploader_id", "created_at"
+    )
     return {
         "code": 200,
         "msg": "获取成功",
@@ -3,22 +3,37 @@ import uuid
 import sys
 import io
 import traceback
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from app.models.user import User
 from app.models.oj import Problem, Submission, UserLessonProgress
 from app.models.course import Lesson
 from app.schemas.oj import SubmitReq, SubmissionOut, ProblemOut,ProblemCreateReq
 from app.deps import get_current_user
+from app.services.cache_version import CacheVersion
+from app.utils.etag import problem_version, make_etag, is_not_modified, not_modified, set_etag
 
 router = APIRouter(prefix="/oj", tags=["OnlineJudge"])
 
 
 # 1. 获取题目详情
 @router.get("/problems/{problem_id}")
-async def get_problem(problem_id: int):
+async def get_problem(problem_id: int, request: Request, response: Response):
+    # ETag: 题目版本号没变 (If-None-Match 命中) 直接 304，不查库
+    etag = None
+    try:
+        version, = await CacheVersion.get(problem_version(problem_id))
+        etag = make_etag("problem", problem_id, version)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+    except Exception:
+        pass
+
     problem = await Problem.get_or_none(id=problem_id)
     if not problem:
         raise HTTPException(404, "题目不存在")
+
+    if etag:
+        set_etag(response, etag)
     return {"code": 200, "data": ProblemOut.model_validate(problem)}
 
 
@@ -1,38 +1,98 @@
+from typing import List
+from app.config import settings
 from app.models.course import Course
 from app.services.es_sync import CourseESService
+from app.services.vector_db import VectorDBService
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def sync_course_task(msg: dict):
+async def sync_courses_batch(msgs: List[dict]):
     """
-    消费者回调函数：处理 ES 同步逻辑
-    消息格式: {"id": 1, "action": "update" | "delete"}
+    批量消费者回调函数 (RabbitMQClient.consume_batch)
+    消息格式: {"id": 1, "action": "update" | "delete", "fields": ["title", ...] (可选，变化的字段)}
+             {"teacher_id": 1, "action": "teacher"} (讲师改了显示名)
+    1. 同一课程在一个批次里的多条消息合并成一条 (连续编辑 N 次只同步一次)
+    2. 需要更新的课程一次 id__in 查询取最新状态
+    3. 消息带 fields 时只做局部更新；标题/简介变了顺便重新生成向量
+    4. 写入 + 局部更新 + 删除合并成一次 ES _bulk 请求
+    5. 讲师改名消息按讲师去重，每位讲师一次 _update_by_query
     """
-    course_id = msg.get("id")
-    action = msg.get("action")
+    teacher_ids = {msg["teacher_id"] for msg in msgs if msg.get("action") == "teacher" and msg.get("teacher_id")}
+    if teacher_ids:
+        await _sync_teacher_names(teacher_ids)
 
-    if not course_id:
+    # 按到达顺序合并: 删除覆盖之前的更新；多次更新的 fields 取并集，任意一次是整篇更新 (None) 就整篇更新
+    latest = {}
+    for msg in msgs:
+        course_id = msg.get("id")
+        if not course_id or msg.get("action") == "teacher":
+            continue
+        action = msg.get("action")
+        fields = set(msg["fields"]) if msg.get("fields") is not None else None
+
+        prev = latest.get(course_id)
+        if action == "update" and prev and prev[0] == "update":
+            fields = None if prev[1] is None or fields is None else prev[1] | fields
+        latest[course_id] = (action, fields)
+
+    if not latest:
         return
 
-    logger.info(f"🔧 [Worker] 开始处理: ID={course_id}, Action={action}")
+    updates = {cid: fields for cid, (action, fields) in latest.items() if action == "update"}
+    delete_ids = {cid for cid, (action, _) in latest.items() if action == "delete"}
+
+    logger.info(
+        f"🔧 [Worker] 开始处理: {len(msgs)} 条消息 -> 合并后 {len(latest)} 门课程 "
+        f"(更新 {len(updates)}, 删除 {len(delete_ids)})"
+    )
 
     try:
-        if action == "delete":
-            await CourseESService.delete_course(course_id)
-
-        elif action == "update":
-            # 关键点：收到消息后，再去数据库查最新的状态
-            # 这样避免了消息队列里的数据是旧的 (Stale Data)
-            course = await Course.get_or_none(id=course_id)
-            if course:
-                await CourseESService.sync_course(course)
-            else:
-                # 查不到可能已经被删了，保险起见删一下 ES
-                await CourseESService.delete_course(course_id)
+        # 关键点：收到消息后，再去数据库查最新的状态
+        # 这样避免了消息队列里的数据是旧的 (Stale Data)
+        courses = await Course.filter(id__in=list(updates)) if updates else []
+
+        # 查不到可能已经被删了，保险起见删一下 ES
+        found = {c.id for c in courses}
+        delete_ids.update(cid for cid in updates if cid not in found)
+
+        # 标题/简介变了: 重新生成向量 (写回 pgvector 并刷新相似推荐)
+        reembed = [
+            c for c in courses
+            if updates[c.id] is not None and updates[c.id] & VectorDBService.EMBEDDING_SOURCE_FIELDS
+        ]
+        embeddings = await VectorDBService.update_course_embeddings(reembed)
+
+        # 局部更新只保留 ES 索引的字段
+        partial_fields = {
+            c.id: updates[c.id] & set(CourseESService.INDEXED_FIELDS)
+            for c in courses if updates[c.id] is not None
+        }
+        courses = [c for c in courses if c.id not in partial_fields or partial_fields[c.id]]
+
+        # 新向量只在混合检索模式下才写进 ES 文档
+        success, failed = await CourseESService.bulk_sync(
+            courses, delete_ids, compute_missing=True, partial_fields=partial_fields,
+            embeddings=embeddings if settings.ES_HYBRID_SEARCH else None
+        )
+        if failed:
+            # 抛出异常让整批 nack 重试 (写入 ES 是幂等的)
+            raise RuntimeError(f"{failed} 条写入失败")
+        logger.info(f"📡 [Worker] 批量同步完成: {success} 条")
 
     except Exception as e:
         logger.error(f"💥 [Worker] 同步发生异常: {e}")
-        # 如果这里抛出异常，aio-pika 默认机制可能会重试或丢弃，取决于配置
-        raise e
\ No newline at end of file
+        raise e
+
+
+async def _sync_teacher_names(teacher_ids: set):
+    """讲师改名: 从数据库读最新显示名，改写该讲师所有课程的 ES 文档"""
+    try:
+        names = await CourseESService.teacher_names(teacher_ids)
+        for teacher_id, name in names.items():
+            updated = await CourseESService.update_teacher_name(teacher_id, name)
+            logger.info(f"📡 [Worker] 讲师 {teacher_id} 显示名已同步到 {updated} 门课程")
+    except Exception as e:
+        logger.error(f"💥 [Worker] 同步讲师显示名异常: {e}")
+        raise e
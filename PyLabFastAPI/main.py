@@ -3,8 +3,11 @@
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from scalar_fastapi import get_scalar_api_reference
 from tortoise import Tortoise
 import logging
@@ -23,12 +26,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.core.es import ESClient
 from app.services.es_sync import CourseESService
 from app.services.vector_db import VectorDBService
+from app.services.embedding_client import EmbeddingClient
+from app.services.view_counter import ViewCounterService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.course_stats import CourseStatsService
+from app.services.outbox_relay import OutboxRelay
+from app.services.course_reconcile import CourseReconcileService
 import app.signals  # 信号监听
 
 # === [新增引入] MQ 客户端与消费者任务 ===
-from app.workers.es_worker import sync_course_task
+from app.workers.es_worker import sync_courses_batch
 logging.basicConfig(level=logging.INFO)
 from app.core.mq import RabbitMQClient
+from app.core.redis_client import RedisClient
 
 # === [核心改造] 定义生命周期管理器 ===
 @asynccontextmanager
@@ -39,9 +49,12 @@ async def lifespan(app: FastAPI):
     # 1. 数据库 (保持不变)
     await Tortoise.init(
         db_url=settings.DB_URL,
-        modules={"models": ["app.models.user", "app.models.course", "app.models.oj", "app.models.chat"]},
+        modules={"models": ["app.models.user", "app.models.course", "app.models.oj", "app.models.chat", "app.models.outbox"]},
     )
     await Tortoise.generate_schemas()
+    await CourseStatsService.init()
+    await OutboxRelay.init()
+    await CourseReconcileService.init()
     print("✅ [Database] PostgreSQL 连接成功")
 
     # 2. 向量库 (保持不变)
@@ -64,33 +77,61 @@ async def lifespan(app: FastAPI):
 
         # B. 启动消费者 (必须指定 队列名 和 路由键)
         # 假设：只要是有 'task.course.sync' 路由键的消息，都由这个 task 处理
-        await RabbitMQClient.consume(
+        # 批量消费: 攒 0.5s / 200 条，同一课程去重后一次 _bulk 写入 ES
+        await RabbitMQClient.consume_batch(
             queue_name="q_course_sync",  # 队列名 (持久化存在 RabbitMQ 里)
             routing_key="task.course.sync",  # 发送消息时用的 Key
-            callback_func=sync_course_task  # 你的业务函数
+            callback_func=sync_courses_batch,  # 你的业务函数
+            max_batch=200,
+            window=0.5
         )
 
     except Exception as e:
         print(f"⚠️ [RabbitMQ] 启动失败 (请检查 Docker): {e}")
 
+    # 5. 后台任务: 浏览量定期落库
+    view_flusher = asyncio.create_task(ViewCounterService.run_flusher())
+    # 6. 后台任务: 发件箱事件投递到 MQ (MQ 暂时不可用时事件留在表里，恢复后补发)
+    outbox_relay = asyncio.create_task(OutboxRelay.run())
+    # 7. 后台任务 (可选): ES / 向量增量对账
+    reconciler = None
+    if settings.ES_RECONCILE_INTERVAL > 0:
+        reconciler = asyncio.create_task(CourseReconcileService.run(settings.ES_RECONCILE_INTERVAL))
+    # 8. 后台任务: 定期打印查询向量缓存命中率
+    embedding_stats = asyncio.create_task(EmbeddingCache.run_stats_logger())
+
     # --- ⏸️ 应用运行中 (Yield) ---
     yield
 
     # --- 🔴 关闭阶段 (Shutdown) ---
     print("🛑 [Lifespan] 系统关闭中...")
 
-    # 5. 关闭 MQ
+    # 5. 停止后台任务，最后落库一次浏览量
+    view_flusher.cancel()
+    embedding_stats.cancel()
+    if reconciler:
+        reconciler.cancel()
+    try:
+        await ViewCounterService.flush()
+    except Exception as e:
+        print(f"⚠️ [Views] 关闭前落库失败: {e}")
+
+    # 6. 停止发件箱投递 (未投递的事件留在表里，下次启动继续)，再关闭 MQ
+    outbox_relay.cancel()
     await RabbitMQClient.close()
 
-    # 6. 关闭其他资源 (保持不变)
+    # 7. 关闭其他资源 (保持不变)
     await ESClient.close()
+    await RedisClient.close()
+    await EmbeddingClient.close()
     await Tortoise.close_connections()
     print("👋 [Lifespan] 资源已释放")
 
 
 # === 初始化 FastAPI ===
 # 将 lifespan 函数传给 FastAPI
-app = FastAPI(lifespan=lifespan)
+# 默认用 orjson 编码响应体 (比标准库 json 快得多)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # 👇👇👇 2. [CORS 配置]
 origins = [
@@ -105,6 +146,8 @@ app.add_middleware(
     allow_methods=["*"],        # 允许所有方法 (POST, GET, OPTIONS...)
     allow_headers=["*"],        # 允许所有 Header
 )
+# 大于 1KB 的响应 gzip 压缩 (Starlette 默认跳过 text/event-stream，AI 流式输出不受影响)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
 # === 注册文档路由 ===
 @app.get("/scalar", include_in_schema=False)
 async def scalar_docs():
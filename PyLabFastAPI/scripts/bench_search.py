@@ -0,0 +1,443 @@
+# scripts/bench_search.py
+"""
+课程搜索离线基准测试
+
+把一份固定的合成课程语料 + 带相关度标注的查询集写入本地 ES 和 PostgreSQL，
+用确定性的本地哈希向量代替 Ollama，对比以下几种检索模式:
+  - es:        ES 关键词召回
+  - vector:    pgvector 向量召回
+  - rrf:       双路并发召回 + RRF 融合 (线上默认链路)
+  - es_hybrid: ES 原生 BM25 + kNN 混合检索 (需要 --modes 显式指定)
+输出 recall@k / nDCG@k / p50/p95/p99 延迟 (JSON)，可以和基线结果对比做回归门禁
+
+用法:
+  python scripts/bench_search.py --db-url postgres://... --output bench.json
+  python scripts/bench_search.py --db-url postgres://... --rrf-k 30 --threshold 0.4 --baseline bench.json
+
+⚠️ 会建表并写入测试数据，请使用独立的基准测试数据库 (--db-url 或环境变量 BENCH_DB_URL)
+"""
+import sys
+import os
+
+# 将项目根目录加入 python path，防止找不到 app 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import math
+import random
+import time
+from typing import Dict, List
+
+from elasticsearch.helpers import async_bulk
+from tortoise import Tortoise
+
+from app.config import settings
+from app.core.es import ESClient
+from app.models.course import Course
+from app.models.user import User, UserRole
+from app.services.course_search import HybridSearchService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_client import EmbeddingClient
+from app.services.es_sync import CourseESService
+from app.services.vector_db import VectorDBService
+
+# === 合成语料 ===
+TOPICS = {
+    "python": ("Python", ["基础语法", "列表推导式", "装饰器", "生成器与迭代器", "异步编程 asyncio", "面向对象"]),
+    "algo": ("算法", ["动态规划", "二分查找", "图论最短路", "贪心算法", "排序算法", "回溯搜索"]),
+    "ds": ("数据结构", ["链表", "二叉树", "哈希表", "堆与优先队列", "并查集", "栈和队列"]),
+    "ml": ("机器学习", ["线性回归", "决策树", "神经网络", "梯度下降", "支持向量机", "聚类分析"]),
+    "web": ("Web 开发", ["FastAPI 接口", "RESTful 设计", "Vue 前端", "HTTP 协议", "JWT 认证", "WebSocket 实时通信"]),
+    "db": ("数据库", ["SQL 查询", "索引优化", "事务隔离级别", "PostgreSQL", "Redis 缓存", "分库分表"]),
+}
+LEVELS = ["入门", "进阶", "实战", "精讲"]
+
+BENCH_TEACHER = "bench_teacher"
+COVER_PREFIX = "bench://"
+SEED = 20240601
+
+
+def build_corpus(copies: int) -> List[dict]:
+    """
+    生成固定的课程语料 (同一个 copies 每次结果完全一样)
+    每门课程: 一个主题 + 一个主知识点 + 一个难度；简介里提到同主题的其他知识点，并混入少量跨主题干扰词
+    """
+    rng = random.Random(SEED)
+    all_terms = [term for _, terms in TOPICS.values() for term in terms]
+    corpus = []
+    for copy in range(copies):
+        for topic, (topic_name, terms) in TOPICS.items():
+            for term in terms:
+                for level in LEVELS:
+                    others = rng.sample([t for t in terms if t != term], 2)
+                    noise = rng.choice(all_terms)
+                    suffix = f" (第{copy + 1}期)" if copy else ""
+                    corpus.append({
+                        "key": f"{topic}:{term}:{level}:{copy}",
+                        "topic": topic,
+                        "term": term,
+                        "title": f"{topic_name}{level}：{term}{suffix}",
+                        "desc": f"本课程系统讲解{term}，并涉及{others[0]}、{others[1]}等{topic_name}知识点，"
+                                f"课后练习会用到{noise}。",
+                        "price": rng.choice([0, 0, 49, 99, 199]),
+                    })
+    return corpus
+
+
+def build_queries(corpus: List[dict]) -> List[dict]:
+    """
+    查询集 + 相关度标注 (graded relevance)
+    - 知识点查询: 主知识点相同 = 2，同主题其他课程 = 1
+    - 主题查询: 同主题课程 = 1
+    """
+    queries = []
+    for topic, (topic_name, terms) in TOPICS.items():
+        for term in terms:
+            labels = {}
+            for doc in corpus:
+                if doc["topic"] == topic:
+                    labels[doc["key"]] = 2 if doc["term"] == term else 1
+            queries.append({"query": term, "labels": labels})
+
+        labels = {doc["key"]: 1 for doc in corpus if doc["topic"] == topic}
+        queries.append({"query": f"{topic_name}课程", "labels": labels})
+    return queries
+
+
+# === 确定性的本地向量 (代替 Ollama) ===
+def hash_embedding(text: str, dim: int = VectorDBService.EMBEDDING_DIM) -> List[float]:
+    """
+    字符 1~3-gram 特征哈希到 dim 维并做 L2 归一化
+    只依赖文本本身 (不受 PYTHONHASHSEED 影响)，字面重叠越多余弦距离越近
+    """
+    text = EmbeddingCache.normalize(text).lower()
+    vec = [0.0] * dim
+    for n in (1, 2, 3):
+        for i in range(len(text) - n + 1):
+            gram = text[i:i + n]
+            if gram.isspace():
+                continue
+            h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+            vec[h % dim] += (1.0 if (h >> 32) & 1 else -1.0) * n
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def patch_embeddings(with_cache: bool):
+    """把 EmbeddingClient 换成本地哈希向量；默认不走查询向量缓存 (避免依赖 Redis)"""
+
+    async def embed(cls, text: str, model: str) -> List[float]:
+        return hash_embedding(text)
+
+    async def embed_many(cls, texts: List[str], model: str) -> List[List[float]]:
+        return [hash_embedding(t) for t in texts]
+
+    EmbeddingClient.embed = classmethod(embed)
+    EmbeddingClient.embed_many = classmethod(embed_many)
+    # 缓存 key 里带模型名，不会和真实的 nomic-embed-text 向量混在一起
+    VectorDBService.MODEL_NAME = "bench-hash"
+
+    if not with_cache:
+        async def cache_get(cls, model: str, normalized_text: str):
+            return None
+
+        async def cache_set(cls, model: str, normalized_text: str, embedding: List[float]):
+            return None
+
+        EmbeddingCache.get = classmethod(cache_get)
+        EmbeddingCache.set = classmethod(cache_set)
+
+
+# === 数据加载 ===
+async def load_corpus(corpus: List[dict], with_vectors_in_es: bool) -> Dict[str, int]:
+    """写入 PostgreSQL (含向量) 和 ES，返回 语料 key -> 课程 ID"""
+    teacher, _ = await User.get_or_create(
+        username=BENCH_TEACHER, defaults={"nickname": "Bench", "role": UserRole.TEACHER}
+    )
+    # 只清理基准测试讲师名下的课程
+    await Course.filter(teacher_id=teacher.id).delete()
+    await Course.bulk_create([
+        Course(
+            teacher_id=teacher.id,
+            title=doc["title"],
+            desc=doc["desc"],
+            cover=f"{COVER_PREFIX}{doc['key']}",
+            price=doc["price"],
+            is_published=True,
+        )
+        for doc in corpus
+    ])
+    id_map = await corpus_ids()
+
+    # 向量: 一条 UPDATE ... FROM unnest 批量写入
+    embeddings = await VectorDBService.get_embeddings(
+        [VectorDBService.course_text(doc["title"], doc["desc"]) for doc in corpus]
+    )
+    conn = Course._meta.db
+    await conn.execute_query(
+        """
+        UPDATE courses AS c SET embedding = v.embedding::vector
+        FROM unnest($1::int[], $2::text[]) AS v(id, embedding)
+        WHERE c.id = v.id
+        """,
+        [
+            [id_map[doc["key"]] for doc in corpus],
+            [VectorDBService._to_pgvector(e) for e in embeddings],
+        ]
+    )
+
+    # ES: 重建基准测试索引后批量写入
+    client = ESClient.get()
+    await client.indices.delete(index=CourseESService.INDEX_NAME, ignore_unavailable=True)
+    # 只在建索引时打开: 查询阶段 rrf 模式仍然要走双路召回 (es_hybrid 模式直接调用 _search_in_es)
+    settings.ES_HYBRID_SEARCH = with_vectors_in_es
+    try:
+        await CourseESService.create_index()
+    finally:
+        settings.ES_HYBRID_SEARCH = False
+
+    courses = await Course.filter(teacher_id=teacher.id)
+    vectors = {id_map[doc["key"]]: e for doc, e in zip(corpus, embeddings)}
+    actions = []
+    for c in courses:
+        doc = CourseESService.build_doc(c)
+        # build_doc 只在 ES_HYBRID_SEARCH 打开时带向量，这里按索引映射直接写入
+        if with_vectors_in_es:
+            doc["embedding"] = vectors[c.id]
+        actions.append({"_index": CourseESService.INDEX_NAME, "_id": str(c.id), "_source": doc})
+    await async_bulk(client, actions)
+    await client.indices.refresh(index=CourseESService.INDEX_NAME)
+    return id_map
+
+
+async def corpus_ids() -> Dict[str, int]:
+    rows = await Course.filter(
+        teacher__username=BENCH_TEACHER, cover__startswith=COVER_PREFIX
+    ).values("id", "cover")
+    return {r["cover"][len(COVER_PREFIX):]: r["id"] for r in rows}
+
+
+# === 指标 ===
+def recall_at_k(ranked: List[int], relevant: Dict[int, int], k: int) -> float:
+    """前 k 条里命中的相关课程数 / min(相关课程总数, k) (相关课程多于 k 时满分为 1)"""
+    if not relevant:
+        return 0.0
+    hits = sum(1 for cid in ranked[:k] if relevant.get(cid, 0) > 0)
+    return hits / min(len(relevant), k)
+
+
+def ndcg_at_k(ranked: List[int], relevant: Dict[int, int], k: int) -> float:
+    dcg = sum((2 ** relevant.get(cid, 0) - 1) / math.log2(i + 2) for i, cid in enumerate(ranked[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """nearest-rank 百分位"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# === 检索模式 ===
+async def run_mode(mode: str, query: str) -> List[int]:
+    if mode == "es":
+        resp = await HybridSearchService._es_recall(query)
+        return [h["id"] for h in resp["hits"]]
+    if mode == "vector":
+        hits = await HybridSearchService._vector_recall(query)
+        return [h["id"] for h in hits]
+    if mode == "rrf":
+        return (await HybridSearchService._search(query))["ids"]
+    if mode == "es_hybrid":
+        return (await HybridSearchService._search_in_es(query))["ids"]
+    raise ValueError(f"未知的检索模式: {mode}")
+
+
+async def bench_mode(mode: str, queries: List[dict], id_map: Dict[str, int], ks: List[int],
+                     repeat: int, warmup: int) -> dict:
+    labeled = [
+        (q["query"], {id_map[key]: grade for key, grade in q["labels"].items() if key in id_map})
+        for q in queries
+    ]
+
+    # 预热 (建立连接池、填充 ES 查询缓存等)，不计入结果
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query, _ in labeled[:warmup]:
+            await run_mode(mode, query)
+
+    latencies, recalls, ndcgs = [], {k: [] for k in ks}, {k: [] for k in ks}
+    errors = 0
+    # search_similar_courses 会打印调试日志，基准测试期间屏蔽掉
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            for query, relevant in labeled:
+                start = time.perf_counter()
+                try:
+                    ranked = await run_mode(mode, query)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+                for k in ks:
+                    recalls[k].append(recall_at_k(ranked, relevant, k))
+                    ndcgs[k].append(ndcg_at_k(ranked, relevant, k))
+
+    latencies.sort()
+
+    def mean(values: List[float]) -> float:
+        return round(sum(values) / len(values), 4) if values else 0.0
+
+    return {
+        "queries": len(labeled),
+        "runs": len(latencies),
+        "errors": errors,
+        **{f"recall@{k}": mean(recalls[k]) for k in ks},
+        **{f"ndcg@{k}": mean(ndcgs[k]) for k in ks},
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(mean(latencies), 3),
+        },
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict, quality_tolerance: float,
+                          latency_tolerance: float) -> List[str]:
+    """
+    回归检查: 质量指标下降超过 quality_tolerance (绝对值)，
+    或 p95 延迟超过基线的 (1 + latency_tolerance) 倍，即视为回归
+    latency_tolerance < 0 表示不检查延迟
+    """
+    failures = []
+    for mode, current in report["modes"].items():
+        base = baseline.get("modes", {}).get(mode)
+        if not base:
+            continue
+        for metric, value in current.items():
+            if not metric.startswith(("recall@", "ndcg@")) or metric not in base:
+                continue
+            if value < base[metric] - quality_tolerance:
+                failures.append(f"{mode}.{metric}: {value} < 基线 {base[metric]}")
+
+        if latency_tolerance >= 0:
+            p95, base_p95 = current["latency_ms"]["p95"], base["latency_ms"]["p95"]
+            if base_p95 and p95 > base_p95 * (1 + latency_tolerance):
+                failures.append(f"{mode}.latency_ms.p95: {p95} > 基线 {base_p95} x {1 + latency_tolerance}")
+    return failures
+
+
+async def main(args) -> int:
+    db_url = args.db_url or os.getenv("BENCH_DB_URL")
+    if not db_url:
+        print("❌ 请通过 --db-url 或环境变量 BENCH_DB_URL 指定独立的基准测试数据库")
+        return 2
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    ks = sorted({int(k) for k in args.k.split(",")})
+
+    # 检索参数 (本次要评估的配置)
+    HybridSearchService.RRF_K = args.rrf_k
+    HybridSearchService.RECALL_LIMIT = args.depth
+    HybridSearchService.VECTOR_THRESHOLD = args.threshold
+    CourseESService.INDEX_NAME = args.es_index
+    settings.ES_HYBRID_SEARCH = False
+    patch_embeddings(args.with_cache)
+
+    await Tortoise.init(
+        db_url=db_url,
+        modules={"models": ["app.models.user", "app.models.course", "app.models.oj"]}
+    )
+    await Tortoise.generate_schemas()
+    ESClient.init()
+
+    try:
+        corpus = build_corpus(args.copies)
+        queries = build_queries(corpus)
+
+        if args.skip_load:
+            id_map = await corpus_ids()
+        else:
+            print(f"📦 写入合成语料: {len(corpus)} 门课程，{len(queries)} 条查询", file=sys.stderr)
+            # 服务层的 print 日志不输出到 stdout (stdout 只留给 JSON 结果)
+            with contextlib.redirect_stdout(sys.stderr):
+                await VectorDBService.init_vector_column()
+                id_map = await load_corpus(corpus, with_vectors_in_es="es_hybrid" in modes)
+
+        report = {
+            "config": {
+                "copies": args.copies,
+                "corpus_size": len(corpus),
+                "queries": len(queries),
+                "rrf_k": args.rrf_k,
+                "depth": args.depth,
+                "threshold": args.threshold,
+                "vector_index": settings.VECTOR_INDEX_METHOD,
+                "repeat": args.repeat,
+            },
+            "modes": {},
+        }
+        for mode in modes:
+            print(f"⏱️ 正在测试: {mode}", file=sys.stderr)
+            report["modes"][mode] = await bench_mode(mode, queries, id_map, ks, args.repeat, args.warmup)
+    finally:
+        await ESClient.close()
+        await Tortoise.close_connections()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = compare_with_baseline(report, baseline, args.quality_tolerance, args.latency_tolerance)
+        if failures:
+            print("❌ 检测到回归:", file=sys.stderr)
+            for failure in failures:
+                print(f"   - {failure}", file=sys.stderr)
+            return 1
+        print("✅ 与基线相比没有回归", file=sys.stderr)
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="课程搜索离线基准测试 (recall@k / nDCG / 延迟)")
+    parser.add_argument("--db-url", help="基准测试专用 PostgreSQL (默认读环境变量 BENCH_DB_URL)")
+    parser.add_argument("--es-index", default="pylab_courses_bench", help="基准测试专用 ES 索引")
+    parser.add_argument("--modes", default="es,vector,rrf", help="逗号分隔: es,vector,rrf,es_hybrid")
+    parser.add_argument("--k", default="5,10,20", help="逗号分隔的 k 值")
+    parser.add_argument("--copies", type=int, default=3, help="语料副本数 (每份 144 门课程)")
+    parser.add_argument("--rrf-k", type=int, default=HybridSearchService.RRF_K)
+    parser.add_argument("--depth", type=int, default=HybridSearchService.RECALL_LIMIT, help="每一路召回深度")
+    parser.add_argument("--threshold", type=float, default=HybridSearchService.VECTOR_THRESHOLD,
+                        help="向量召回距离阈值")
+    parser.add_argument("--repeat", type=int, default=5, help="查询集重复次数 (用于统计延迟)")
+    parser.add_argument("--warmup", type=int, default=10, help="预热查询数")
+    parser.add_argument("--with-cache", action="store_true", help="查询向量走 EmbeddingCache (需要 Redis)")
+    parser.add_argument("--skip-load", action="store_true", help="复用上次写入的语料")
+    parser.add_argument("--output", help="结果 JSON 写入文件")
+    parser.add_argument("--baseline", help="基线结果 JSON，有回归时退出码为 1")
+    parser.add_argument("--quality-tolerance", type=float, default=0.01, help="质量指标允许下降的绝对值")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5,
+                        help="p95 延迟允许增长的比例，负数表示不检查延迟")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    # Windows 下 asyncio 的常见问题修复
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    sys.exit(asyncio.run(main(parse_args())))
@@ -4,7 +4,9 @@ import os
 # 将项目根目录加入路径，防止 ModuleNotFoundError
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import argparse
 import asyncio
+import time
 from tortoise import Tortoise
 from app.config import settings
 from app.core.es import ESClient
@@ -12,7 +14,7 @@ from app.services.es_sync import CourseESService
 from app.models.course import Course
 
 
-async def main():
+async def main(batch_size: int, concurrency: int):
     print("🚀 开始全量同步数据到 ES...")
 
     # 1. 初始化数据库
@@ -25,32 +27,65 @@ async def main():
         ]}
     )
 
-    # 2. 初始化 ES
+    # 2. 初始化 ES (索引不存在时先建好)
     ESClient.init()
+    await CourseESService.create_index()
 
-    # 3. 获取所有课程
-    courses = await Course.all()
-    print(f"📦 数据库中共有 {len(courses)} 门课程，准备同步...")
+    total = await Course.all().count()
+    print(f"📦 数据库中共有 {total} 门课程，每批 {batch_size} 条，最多 {concurrency} 个批次并发写入...")
 
-    # 4. 循环同步
-    success_count = 0
-    for course in courses:
+    # 3. 按 id 游标分批读取 (不一次性 Course.all() 全部加载进内存)，
+    #    每批一个 _bulk 请求，信号量限制同时在途的批次数
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"success": 0, "failed": 0}
+    tasks = []
+
+    async def index_batch(courses):
         try:
-            await CourseESService.sync_course(course)
-            success_count += 1
+            success, failed = await CourseESService.bulk_sync(courses)
         except Exception as e:
-            print(f"❌ 同步失败 ID={course.id}: {e}")
+            print(f"❌ 批次同步失败 (ID {courses[0].id}~{courses[-1].id}): {e}")
+            success, failed = 0, len(courses)
+        finally:
+            semaphore.release()
+        stats["success"] += success
+        stats["failed"] += failed
+        done = stats["success"] + stats["failed"]
+        print(f"   -> 进度 {done}/{total} ({done / (time.perf_counter() - started):.0f} docs/s)")
+
+    started = time.perf_counter()
+    # 导入期间关闭 refresh、副本数设为 0，结束后自动恢复
+    async with CourseESService.bulk_load_settings():
+        last_id = 0
+        while True:
+            # 先拿到名额再读下一批，内存里最多只有 concurrency 个批次
+            await semaphore.acquire()
+            courses = await Course.filter(id__gt=last_id).order_by("id").limit(batch_size)
+            if not courses:
+                semaphore.release()
+                break
+            last_id = courses[-1].id
+            tasks.append(asyncio.create_task(index_batch(courses)))
 
-    print(f"✅ 全量同步完成！成功: {success_count}/{len(courses)}")
+        await asyncio.gather(*tasks)
 
-    # 5. 关闭资源
+    elapsed = time.perf_counter() - started
+    print(f"✅ 全量同步完成！成功: {stats['success']}/{total}，失败: {stats['failed']}")
+    print(f"⏱️ 耗时 {elapsed:.1f}s，吞吐 {stats['success'] / elapsed if elapsed else 0:.0f} docs/s")
+
+    # 4. 关闭资源
     await ESClient.close()
     await Tortoise.close_connections()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全量同步课程到 ES (批量 + 并发)")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个 _bulk 请求的文档数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时在途的 _bulk 请求数")
+    args = parser.parse_args()
+
     # Windows 下 asyncio 的常见问题修复
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(args.batch_size, args.concurrency))
@@ -0,0 +1,63 @@
+import sys
+import os
+
+# 将项目根目录加入路径，防止 ModuleNotFoundError
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import time
+from tortoise import Tortoise
+from app.config import settings
+from app.core.es import ESClient
+from app.core.redis_client import RedisClient
+from app.services.course_reconcile import CourseReconcileService
+from app.services.embedding_client import EmbeddingClient
+
+
+async def main(full: bool, orphans: bool):
+    print("🚀 开始增量对账 ES / 课程向量...")
+
+    await Tortoise.init(
+        db_url=settings.DB_URL,
+        modules={"models": [
+            "app.models.user",
+            "app.models.course",
+            "app.models.oj"
+        ]}
+    )
+    ESClient.init()
+    await CourseReconcileService.init()
+
+    if full:
+        await CourseReconcileService.reset_watermark()
+        print("🧹 已清空水位线，本次扫描全部课程")
+    else:
+        watermark = await CourseReconcileService.get_watermark()
+        print(f"📍 当前水位线: {watermark[0].isoformat()} (ID {watermark[1]})" if watermark else "📍 尚无水位线，本次扫描全部课程")
+
+    started = time.perf_counter()
+    try:
+        stats = await CourseReconcileService.reconcile(orphans=orphans)
+        if stats is None:
+            print("⏳ 其他进程正在对账，本次跳过")
+        else:
+            print(f"✅ 对账完成 ({time.perf_counter() - started:.1f}s): {stats}")
+    finally:
+        await ESClient.close()
+        await RedisClient.close()
+        await EmbeddingClient.close()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按 updated_at 水位线增量同步课程到 ES 和向量列 (适合 cron 每几分钟跑一次)")
+    parser.add_argument("--full", action="store_true", help="清空水位线，重新扫描全部课程")
+    parser.add_argument("--no-orphans", action="store_true", help="跳过 ES / 数据库 ID 集合比对")
+    args = parser.parse_args()
+
+    # Windows 下 asyncio 的常见问题修复
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    asyncio.run(main(args.full, not args.no_orphans))
@@ -10,6 +10,8 @@ from tortoise import Tortoise
 from app.config import settings
 from app.models.course import Course
 from app.services.vector_db import VectorDBService
+from app.services.embedding_client import EmbeddingClient
+from app.services.course_neighbors import CourseNeighborService
 
 
 async def main():
@@ -25,24 +27,35 @@ async def main():
     courses = await Course.all()
     print(f"📦 发现 {len(courses)} 门课程，准备处理...")
 
-    # 3. 逐个生成向量
+    # 3. 分批生成向量 (每批一次 Ollama 批量调用)
     count = 0
-    for course in courses:
+    batch_size = EmbeddingClient.MAX_BATCH_SIZE
+    for i in range(0, len(courses), batch_size):
+        batch = courses[i:i + batch_size]
         # 只要没有向量，或者是想强制刷新，都可以跑
-        try:
+        texts = [VectorDBService.course_text(c.title, c.desc) for c in batch]
+        embeddings = await VectorDBService.get_embeddings(texts)
+
+        valid = {}
+        for course, embedding in zip(batch, embeddings):
             print(f"   -> 正在处理: 《{course.title}》")
-            await VectorDBService.update_course_embedding(
-                course.id,
-                course.title,
-                course.desc or ""
-            )
-            count += 1
-        except Exception as e:
-            print(f"❌ 课程 {course.id} 处理失败: {e}")
+            if not embedding:
+                print(f"❌ 课程 {course.id} 向量生成失败")
+                continue
+            valid[course.id] = embedding
+
+        # 整批一条 UPDATE ... FROM unnest 写回
+        await VectorDBService.save_course_embeddings(valid)
+        count += len(valid)
+
+    # 4. 向量全部刷新后，重建相似课程推荐表
+    print("🧭 正在重建相似课程推荐...")
+    await CourseNeighborService.rebuild_all()
 
     print(f"\n✅ 全部完成！共更新 {count} 门课程的向量数据。")
     print("现在你可以去测试语义搜索了！")
 
+    await EmbeddingClient.close()
     await Tortoise.close_connections()
 
 
@@ -0,0 +1,35 @@
+# tests/test_cursor.py
+import base64
+from datetime import datetime
+
+import pytest
+
+from app.utils.cursor import decode_cursor, encode_cursor
+
+
+def test_round_trip():
+    values = [120, "2024-05-01T08:00:00+00:00", 42]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(["?>?>?>", 1])
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+
+def test_non_json_values_are_stringified():
+    ts = datetime(2024, 5, 1, 8, 0, 0)
+    assert decode_cursor(encode_cursor([ts, 1])) == [str(ts), 1]
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "not-base64*", "中文"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_must_decode_to_list():
+    cursor = base64.urlsafe_b64encode(b'{"id": 1}').decode("ascii").rstrip("=")
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
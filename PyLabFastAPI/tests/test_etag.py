@@ -0,0 +1,52 @@
+# tests/test_etag.py
+from app.utils.etag import is_not_modified, make_etag, not_modified
+
+
+class _Request:
+    """只用到 headers 的最小请求对象"""
+
+    def __init__(self, if_none_match=None):
+        self.headers = {"If-None-Match": if_none_match} if if_none_match is not None else {}
+
+
+def test_make_etag_is_stable_strong_etag():
+    etag = make_etag("course_detail", 1, 0, "3")
+    assert etag == make_etag("course_detail", 1, 0, "3")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert not etag.startswith("W/")
+
+
+def test_make_etag_changes_with_any_part():
+    base = make_etag("course_detail", 1, 0, "3")
+    assert make_etag("course_detail", 1, 0, "4") != base
+    assert make_etag("course_detail", 2, 0, "3") != base
+    assert make_etag("course_detail", 1, 7, "3") != base
+
+
+def test_no_header():
+    assert not is_not_modified(_Request(), make_etag("a"))
+
+
+def test_exact_match():
+    etag = make_etag("a")
+    assert is_not_modified(_Request(etag), etag)
+    assert not is_not_modified(_Request(make_etag("b")), etag)
+
+
+def test_weak_comparison_and_lists():
+    etag = make_etag("a")
+    assert is_not_modified(_Request(f"W/{etag}"), etag)
+    assert is_not_modified(_Request(f'"other", W/{etag}'), etag)
+    assert not is_not_modified(_Request('"other", W/"another"'), etag)
+
+
+def test_wildcard():
+    assert is_not_modified(_Request(" * "), make_etag("a"))
+
+
+def test_not_modified_response():
+    etag = make_etag("a")
+    response = not_modified(etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.headers["Cache-Control"] == "no-cache"
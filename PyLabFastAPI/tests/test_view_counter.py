@@ -0,0 +1,207 @@
+# tests/test_view_counter.py
+# ViewCounterService.flush: 用内存里的假 Redis / 假数据库连接验证落库流程和幂等性
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services import view_counter as view_counter_module
+from app.services.view_counter import ViewCounterService
+
+
+class FakeRedis:
+    """只实现 ViewCounterService 用到的命令 (decode_responses=True 的行为)"""
+
+    def __init__(self):
+        self.data = {}
+        self.fail_delete = set()
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            if key in self.fail_delete:
+                self.fail_delete.discard(key)
+                raise ConnectionError("redis down")
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def hincrby(self, key, field, amount):
+        h = self.data.setdefault(key, {})
+        h[field] = str(int(h.get(field, 0)) + amount)
+        return int(h[field])
+
+    async def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        assert script == ViewCounterService._BEGIN_FLUSH_LUA
+        return self._begin_flush
+
+    async def _begin_flush(self, keys, args):
+        """和 _BEGIN_FLUSH_LUA 相同的逻辑"""
+        pending, flushing, token_key = keys
+        if flushing not in self.data:
+            if pending not in self.data:
+                return None
+            self.data[flushing] = self.data.pop(pending)
+            self.data[token_key] = args[0]
+            return args[0]
+        if token_key not in self.data:
+            self.data[token_key] = args[0]
+        return self.data[token_key]
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeDB:
+    """courses.view_count + course_view_flushes 两张表"""
+
+    def __init__(self, view_counts):
+        self.view_counts = dict(view_counts)
+        self.tokens = set()
+
+    @asynccontextmanager
+    async def transaction(self):
+        # 事务内的写入先记在副本上，正常退出才提交
+        snapshot = FakeDB(self.view_counts)
+        snapshot.tokens = set(self.tokens)
+        yield FakeConn(snapshot)
+        self.view_counts, self.tokens = snapshot.view_counts, snapshot.tokens
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    async def execute_query_dict(self, sql, values=None):
+        if "INSERT INTO course_view_flushes" in sql:
+            token = values[0]
+            if token in self.db.tokens:
+                return []
+            self.db.tokens.add(token)
+            return [{"token": token}]
+        if "UPDATE courses" in sql:
+            rows = []
+            for course_id, delta in zip(*values):
+                if course_id in self.db.view_counts:
+                    self.db.view_counts[course_id] += delta
+                    rows.append({
+                        "id": course_id, "view_count": self.db.view_counts[course_id],
+                        "title": f"课程 {course_id}", "is_published": True,
+                    })
+            return rows
+        raise AssertionError(f"unexpected query: {sql}")
+
+    async def execute_query(self, sql, values=None):
+        assert "DELETE FROM course_view_flushes" in sql
+
+
+@pytest.fixture
+def env(monkeypatch):
+    redis = FakeRedis()
+    db = FakeDB({1: 100, 2: 0})
+    pushed = []
+
+    async def update_view_counts(rows):
+        pushed.append(rows)
+        return len(rows), 0
+
+    monkeypatch.setattr(view_counter_module.RedisClient, "get", classmethod(lambda cls: redis))
+    monkeypatch.setattr(view_counter_module, "in_transaction", db.transaction)
+    monkeypatch.setattr(view_counter_module.CourseESService, "update_view_counts", update_view_counts)
+    return redis, db, pushed
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_flush_writes_deltas_back(env):
+    redis, db, pushed = env
+    for course_id in (1, 1, 1, 2, 404):
+        _run(ViewCounterService.incr(course_id))
+
+    # 不存在的课程 (404) 不计入更新数
+    assert _run(ViewCounterService.flush()) == 2
+    assert db.view_counts == {1: 103, 2: 1}
+    assert [r["id"] for r in pushed[0]] == [1, 2]
+    # 增量、批次 token、锁都清掉了
+    assert redis.data == {}
+
+
+def test_flush_without_views_is_noop(env):
+    redis, db, pushed = env
+    assert _run(ViewCounterService.flush()) == 0
+    assert db.view_counts == {1: 100, 2: 0}
+    assert not pushed
+    assert ViewCounterService.LOCK_KEY not in redis.data
+
+
+def test_flush_skips_when_locked(env):
+    redis, db, _ = env
+    _run(ViewCounterService.incr(1))
+    redis.data[ViewCounterService.LOCK_KEY] = "1"
+    assert _run(ViewCounterService.flush()) == 0
+    assert db.view_counts[1] == 100
+
+
+def test_flush_is_idempotent_after_crash_before_cleanup(env):
+    redis, db, _ = env
+    _run(ViewCounterService.incr(1))
+    _run(ViewCounterService.incr(1))
+
+    # UPDATE 已提交，清理 FLUSHING 时 Redis 出错 (等同于进程在这里挂掉)
+    redis.fail_delete.add(ViewCounterService.FLUSHING_KEY)
+    with pytest.raises(ConnectionError):
+        _run(ViewCounterService.flush())
+    assert db.view_counts[1] == 102
+    assert ViewCounterService.FLUSHING_KEY in redis.data
+
+    # 期间的新浏览进 PENDING，留到下一轮
+    _run(ViewCounterService.incr(1))
+
+    # 重试同一批: token 已落库，不重复累加
+    _run(ViewCounterService.flush())
+    assert db.view_counts[1] == 102
+    assert ViewCounterService.FLUSHING_KEY not in redis.data
+
+    _run(ViewCounterService.flush())
+    assert db.view_counts[1] == 103
+
+
+def test_incr_counts_batch_being_flushed(env):
+    redis, _, _ = env
+    _run(ViewCounterService.incr(1))
+    _run(ViewCounterService.incr(1))
+    # 模拟 flush 刚改名、还没落库
+    redis.data[ViewCounterService.FLUSHING_KEY] = redis.data.pop(ViewCounterService.PENDING_KEY)
+
+    assert _run(ViewCounterService.incr(1)) == 3